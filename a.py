@@ -1,16 +1,22 @@
 import streamlit as st
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageColor, ImageDraw, ImageFont
 import tempfile
 import os
 from datetime import datetime
 from transformers import pipeline
+import torch
 import easyocr
 import numpy as np
 import cv2
 import io
 import zipfile
+import math
 import re
-from typing import List, Tuple
+import string
+import functools
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Optional, Tuple
 
 # Page config
 st.set_page_config(
@@ -21,44 +27,135 @@ st.set_page_config(
 st.title("🎓 Simple OCR Certificate Generator")
 st.markdown("*Extract names and generate certificates easily*")
 
+# Sentence boundaries used to split OCR text into chunks for batched NER
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+# Deletes ASCII punctuation/symbols in one C-level str.translate pass
+_PUNCT_TBL = str.maketrans('', '', ''.join(
+    ch for ch in map(chr, range(128)) if not ch.isalnum() and not ch.isspace() and ch != '_'
+))
+_SAFE_NAME_RE = re.compile(r'[^\w\s-]')
+NER_BATCH_SIZE = 16
+# Directory of the INT8 ONNX export produced by quantize_ner.py
+NER_ONNX_DIR = os.getenv("NER_ONNX_DIR", "models/bert-base-NER-int8")
+# Set to "openvino" to run EasyOCR through OpenVINO on Intel hosts
+OCR_BACKEND = os.getenv("OCR_BACKEND", "torch").lower()
+OCR_BATCH_SIZE = 16
+# Set to "0" to run the EasyOCR networks eagerly instead of through torch.compile
+OCR_COMPILE = os.getenv("OCR_COMPILE", "1") != "0"
+USE_GPU = torch.cuda.is_available()
+
 # Load models with better error handling
 @st.cache_resource
 def load_ner_model():
     """Load Hugging Face NER model with error handling"""
+    # Prefer the INT8 ONNX Runtime export (see quantize_ner.py) when it has been built
+    if os.path.isdir(NER_ONNX_DIR):
+        try:
+            from optimum.onnxruntime import ORTModelForTokenClassification
+            from transformers import AutoTokenizer
+            ort_model = ORTModelForTokenClassification.from_pretrained(NER_ONNX_DIR)
+            tokenizer = AutoTokenizer.from_pretrained(NER_ONNX_DIR)
+            return pipeline(
+                "ner",
+                model=ort_model,
+                tokenizer=tokenizer,
+                aggregation_strategy="simple",
+                batch_size=NER_BATCH_SIZE,
+            )
+        except Exception as e:
+            st.warning(f"Failed to load quantized NER model, using PyTorch model: {str(e)}")
     try:
-        return pipeline("ner", model="dslim/bert-base-NER", grouped_entities=True)
+        return pipeline(
+            "ner",
+            model="dslim/bert-base-NER",
+            aggregation_strategy="simple",
+            batch_size=NER_BATCH_SIZE,
+            device=0 if USE_GPU else -1,
+        )
     except Exception as e:
         st.error(f"Failed to load NER model: {str(e)}")
         return None
 
+def _compile_ocr_networks(reader) -> None:
+    """Wrap the EasyOCR detector and recognizer in torch.compile on CUDA.
+
+    The CPU reader runs dynamically quantized modules that dynamo cannot
+    trace, and the OpenVINO reader has no torch modules, so both stay eager.
+    Recognizer batches vary in width, hence dynamic shapes.
+    """
+    if not OCR_COMPILE or not hasattr(torch, "compile"):
+        return
+    if not str(getattr(reader, "device", "cpu")).startswith("cuda"):
+        return
+    try:
+        import torch._dynamo
+        # Fall back to eager for any graph that fails to compile at call time
+        torch._dynamo.config.suppress_errors = True
+        reader.detector = torch.compile(reader.detector, mode="reduce-overhead", dynamic=True)
+        reader.recognizer = torch.compile(reader.recognizer, mode="reduce-overhead", dynamic=True)
+    except Exception as e:
+        st.warning(f"torch.compile unavailable for OCR, running eagerly: {str(e)}")
+
 @st.cache_resource 
 def load_ocr_model():
     """Load EasyOCR model with error handling"""
+    reader = None
+    if OCR_BACKEND == "openvino":
+        try:
+            # Only available on EasyOCR builds with the OpenVINO backend (upstream PR #1235)
+            reader = easyocr.Reader(
+                ['en'], gpu=False, detector='craft', recognizer='standard',
+                quantize=True, backend='openvino'
+            )
+        except TypeError:
+            st.warning("This EasyOCR build has no OpenVINO backend, using PyTorch instead.")
+        except Exception as e:
+            st.warning(f"Failed to load OpenVINO OCR model, using PyTorch instead: {str(e)}")
+    if reader is None:
+        try:
+            # EasyOCR will download models on first run, 'en' for English
+            reader = easyocr.Reader(['en'], gpu=USE_GPU, quantize=True)
+        except Exception as e:
+            st.error(f"Failed to load OCR model: {str(e)}")
+            return None
+
+    _compile_ocr_networks(reader)
+    
+    # Warm up once so the first real batch doesn't pay for lazy initialization
+    # (including the first torch.compile pass)
     try:
-        # EasyOCR will download models on first run, 'en' for English
-        return easyocr.Reader(['en'], gpu=False) 
-    except Exception as e:
-        st.error(f"Failed to load OCR model: {str(e)}")
-        return None
+        reader.readtext_batched([np.full((64, 256), 255, dtype=np.uint8)], batch_size=1)
+    except Exception:
+        pass
+    return reader
 
 # Initialize models
 ner_pipeline = load_ner_model()
 ocr_reader = load_ocr_model()
 
+if ocr_reader is not None and str(getattr(ocr_reader, "device", "cpu")).startswith("cuda"):
+    st.sidebar.success(f"⚡ OCR running on GPU ({torch.cuda.get_device_name(0)})")
+else:
+    st.sidebar.info("🖥️ OCR running on CPU")
+
 def extract_names_with_ner(text: str, min_score: float = 0.8) -> List[str]:
     """Simple NER-based name extraction"""
     if not ner_pipeline or not text.strip():
         return []
     
     try:
-        results = ner_pipeline(text)
+        # Split into sentence chunks and sort by length so each batch pads to a similar size
+        chunks = [chunk for chunk in _SENTENCE_SPLIT_RE.split(text) if chunk.strip()]
+        chunks.sort(key=len)
+        results_batches = ner_pipeline(chunks, batch_size=NER_BATCH_SIZE)
+        results = [entity for batch in results_batches for entity in batch]
         names = []
         
         for entity in results:
             if entity["entity_group"] == "PER" and entity["score"] >= min_score:
                 name = entity["word"].replace(' ##', '').strip()
                 # Clean up the name
-                name = re.sub(r'[^\w\s]', '', name)
+                name = name.translate(_PUNCT_TBL)
                 name = ' '.join([word.capitalize() for word in name.split() if word.isalpha()])
                 
                 if len(name) > 2 and name not in names:
@@ -69,51 +166,43 @@ def extract_names_with_ner(text: str, min_score: float = 0.8) -> List[str]:
         st.warning(f"NER processing failed: {str(e)}")
         return []
 
+# Phrases that look like capitalised names but belong to certificate boilerplate
+_NON_NAME_PHRASES_RE = re.compile('|'.join(map(re.escape, (
+    'this certificate', 'is hereby presented to', 'for successful completion',
+    'date of issue', 'signature of', 'program director', 'has successfully',
+    'award', 'presented by', 'congratulations', 'achieved', 'hereby certifies'
+))), re.IGNORECASE)
+
+@functools.lru_cache(maxsize=8)
+def _probable_name_re(min_words: int, max_words: int) -> re.Pattern:
+    """min_words..max_words capitalised alphabetic words (EasyOCR 'en' output is ASCII)"""
+    word = r'[A-Z][A-Za-z]*'
+    return re.compile(rf'{word}(?:\s+{word}){{{min_words - 1},{max_words - 1}}}')
+
 def is_probable_name(line: str, min_words: int = 2, max_words: int = 4) -> bool:
     """Improved heuristic name detection with stricter rules."""
+    # One regex covers the word count, capitalisation, letters-only and no-digits rules
     line = line.strip()
-    if not line:
+    if not _probable_name_re(min_words, max_words).fullmatch(line):
         return False
 
-    words = line.split()
-
-    # Check word count
-    if not (min_words <= len(words) <= max_words):
-        return False
-
-    # Check if all words start with a capital letter and contain mostly letters
-    for word in words:
-        if not word.isalpha() or not word[0].isupper():
-            return False
-
     # Filter out common phrases or non-name patterns
-    common_non_name_phrases = {
-        'this certificate', 'is hereby presented to', 'for successful completion',
-        'date of issue', 'signature of', 'program director', 'has successfully',
-        'award', 'presented by', 'congratulations', 'achieved', 'hereby certifies'
-    }
-    if any(phrase in line.lower() for phrase in common_non_name_phrases):
-        return False
-        
-    # Heuristic to check if the line contains a number (often not part of a name)
-    if any(char.isdigit() for char in line):
-        return False
+    return _NON_NAME_PHRASES_RE.search(line) is None
 
-    return True
+def _gray_array(pil_image: Image.Image) -> np.ndarray:
+    """Grayscale uint8 view over PIL's exported bytes (read-only, no second copy)"""
+    gray = pil_image.convert("L")
+    return np.frombuffer(gray.tobytes(), dtype=np.uint8).reshape(gray.height, gray.width)
 
 def simple_preprocess_image(pil_image: Image.Image) -> np.ndarray:
     """Enhanced image preprocessing for better OCR results."""
     try:
         # Convert to grayscale
-        img = np.array(pil_image.convert("L"))
+        img = _gray_array(pil_image)
 
-        # Simple resize if image is too small (e.g., width < 800)
-        height, width = img.shape
-        if width < 800:
-            scale = 800 / width
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+        # Light denoise on the grayscale image so speckles don't survive thresholding.
+        # Blurring the binary output instead would cost a second full pass.
+        img = cv2.GaussianBlur(img, (3, 3), 0)
 
         # Apply adaptive thresholding for better text separation
         # This helps in images with uneven lighting
@@ -121,118 +210,307 @@ def simple_preprocess_image(pil_image: Image.Image) -> np.ndarray:
             img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
         )
 
-        # Optional: Apply a median blur to remove noise, especially speckles
-        # Be cautious not to blur too much, which can degrade character edges
-        img = cv2.medianBlur(img, 3) # Use a small kernel size like 3
+        # Upscale small images (e.g., width < 800) only after thresholding, so the
+        # filters above run at native size. Nearest keeps the output strictly binary.
+        height, width = img.shape
+        if width < 800:
+            scale = 800 / width
+            new_width = int(width * scale)
+            new_height = int(height * scale)
+            img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_NEAREST)
 
         return img
     except Exception as e:
         st.warning(f"Image preprocessing failed: {str(e)}. Falling back to basic grayscale.")
-        return np.array(pil_image.convert("L"))
+        return _gray_array(pil_image)
+
+def _ocr_images(pil_images: List[Image.Image], reader, confidence_threshold: float) -> Tuple[str, List[str]]:
+    """OCR the images and extract candidate names with NER and line heuristics."""
+    # Preprocess images
+    processed_imgs = [simple_preprocess_image(img) for img in pil_images]
+    
+    # Batched OCR needs one common size. EasyOCR would stretch each image to it, so pad
+    # them onto a white canvas of the largest size instead to keep text proportions intact
+    n_height = max(img.shape[0] for img in processed_imgs)
+    n_width = max(img.shape[1] for img in processed_imgs)
+    processed_imgs = [
+        cv2.copyMakeBorder(img, 0, n_height - img.shape[0], 0, n_width - img.shape[1],
+                           cv2.BORDER_CONSTANT, value=255)
+        for img in processed_imgs
+    ]
+    ocr_batches = reader.readtext_batched(
+        processed_imgs, n_width=n_width, n_height=n_height,
+        batch_size=OCR_BATCH_SIZE, workers=2 if USE_GPU else 0
+    )
+    ocr_results = [result for batch in ocr_batches for result in batch]
+    
+    if not ocr_results:
+        return "No text detected", []
+    
+    # Extract text from results
+    extracted_text_lines = []
+    for result in ocr_results:
+        if len(result) >= 2:  # Make sure result has text
+            text_part = result[1] if isinstance(result[1], str) else str(result[1])
+            extracted_text_lines.append(text_part.strip())
+    
+    extracted_text = " ".join(extracted_text_lines)
+    
+    if not extracted_text:
+        return "No readable text found", []
+    
+    # Extract names using NER
+    ner_names = extract_names_with_ner(extracted_text, min_score=confidence_threshold)
+    
+    # Extract names using heuristics from lines: clean, filter, capitalise and
+    # de-duplicate (keeping order) in a single pass over the OCR lines
+    cleaned_lines = (line.translate(_PUNCT_TBL).strip() for line in extracted_text_lines)
+    heuristic_names = list(dict.fromkeys(
+        ' '.join(word.capitalize() for word in line.split())
+        for line in cleaned_lines if is_probable_name(line)
+    ))
+    
+    # Combine all found names, remove duplicates, and sort
+    all_names = list(set(ner_names + heuristic_names))
+    all_names.sort()
+    
+    return extracted_text, all_names
 
-@st.cache_data
-def run_simple_ocr(_pil_image, _ocr_reader_inst, _ner_pipeline_inst, confidence_threshold: float = 0.8) -> Tuple[str, List[str]]:
+@st.cache_data(persist="disk", show_spinner=False)
+def _cached_ocr(image_hash: str, _image_bytes: List[bytes], confidence_threshold: float) -> Tuple[str, List[str]]:
+    """OCR results cached by content hash, so the same upload is never processed twice."""
+    images = [Image.open(io.BytesIO(data)) for data in _image_bytes]
+    return _ocr_images(images, ocr_reader, confidence_threshold)
+
+def run_simple_ocr(image_bytes: List[bytes], confidence_threshold: float = 0.8) -> Tuple[str, List[str]]:
     """Simplified OCR processing with better error handling and refined name extraction."""
     
-    if not _ocr_reader_inst:
+    if not ocr_reader or not image_bytes:
         return "", []
     
+    # Key the cache on the uploaded bytes; the decoded PIL objects can't be hashed
+    digest = hashlib.blake2b(digest_size=16)
+    for data in image_bytes:
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    
     try:
-        # Preprocess image
-        processed_img = simple_preprocess_image(_pil_image)
-        
-        # Run OCR with basic settings
-        ocr_results = _ocr_reader_inst.readtext(processed_img)
-        
-        if not ocr_results:
-            return "No text detected", []
-        
-        # Extract text from results
-        extracted_text_lines = []
-        for result in ocr_results:
-            if len(result) >= 2:  # Make sure result has text
-                text_part = result[1] if isinstance(result[1], str) else str(result[1])
-                extracted_text_lines.append(text_part.strip())
-        
-        extracted_text = " ".join(extracted_text_lines)
-        
-        if not extracted_text:
-            return "No readable text found", []
-        
-        # Extract names using NER
-        ner_names = extract_names_with_ner(extracted_text, min_score=confidence_threshold)
-        
-        # Extract names using heuristics from lines
-        heuristic_names = []
-        
-        for line in extracted_text_lines: # Iterate through individual lines from OCR
-            cleaned_line = re.sub(r'[^\w\s]', '', line).strip() # Initial clean for heuristics
-            if is_probable_name(cleaned_line):
-                # Ensure each word is capitalized and then join
-                formatted_name = ' '.join(word.capitalize() for word in cleaned_line.split() if word.isalpha())
-                if formatted_name and len(formatted_name) > 2 and formatted_name not in heuristic_names:
-                    heuristic_names.append(formatted_name)
-        
-        # Combine all found names, remove duplicates, and sort
-        all_names = list(set(ner_names + heuristic_names))
-        all_names.sort()
-        
-        return extracted_text, all_names
-        
+        return _cached_ocr(digest.hexdigest(), image_bytes, confidence_threshold)
     except Exception as e:
         error_msg = f"OCR processing failed: {str(e)}"
         st.error(error_msg)
         return error_msg, []
 
-def generate_simple_certificate(
+@functools.lru_cache(maxsize=32)
+def _get_font(path: str, size: int) -> Optional[ImageFont.FreeTypeFont]:
+    """Parse a TrueType font once per (path, size); None if it isn't installed"""
+    try:
+        return ImageFont.truetype(path, size)
+    except IOError:
+        return None
+
+def load_certificate_fonts(font_size: int) -> Tuple[ImageFont.ImageFont, ImageFont.ImageFont]:
+    """Load the name and date fonts for a given size, with fallbacks"""
+    # Try to load a font, fallback to default.
+    # Use a more common default font if arial.ttf is not found on all systems,
+    # then a common system font, or a bundled font if available
+    font = _get_font("arial.ttf", font_size) or _get_font("LiberationSans-Regular.ttf", font_size)
+    if font is None:
+        font = ImageFont.load_default()
+        # Try to make it bigger if possible
+        if hasattr(font, 'font_variant'):
+            try:
+                font = font.font_variant(size=font_size)
+            except:
+                pass # Fallback to default size if font_variant fails
+
+    date_size = max(16, font_size // 3)
+    # Fallback to the main font if date font fails
+    date_font = _get_font("arial.ttf", date_size) or _get_font("LiberationSans-Regular.ttf", date_size) or font
+
+    return font, date_font
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def decode_template(template_bytes: bytes) -> Image.Image:
+    """Decode the uploaded template to RGB once and share it across reruns and batches.
+
+    The returned image is shared; callers must copy it before drawing on it.
+    """
+    return Image.open(io.BytesIO(template_bytes)).convert("RGB")
+
+# Characters rasterized up front for the name atlas; anything else is added on first use
+_GLYPH_ATLAS_CHARS = string.ascii_letters + string.digits + " "
+
+def _rasterize_glyph(font: ImageFont.FreeTypeFont, ch: str) -> tuple:
+    """Rasterize one glyph to (alpha mask, left, top, advance) relative to the 'la' anchor"""
+    left, top, right, bottom = font.getbbox(ch)
+    advance = font.getlength(ch)
+    if right <= left or bottom <= top:
+        return None, left, top, advance  # Blank glyph, e.g. space
+    glyph = Image.new("L", (right - left, bottom - top), 0)
+    ImageDraw.Draw(glyph).text((-left, -top), ch, fill=255, font=font)
+    return np.asarray(glyph, dtype=np.float32)[..., None] / 255.0, left, top, advance
+
+def _pair_advance(font: ImageFont.FreeTypeFont, advances: dict, pair: str) -> float:
+    """Kerned advance of pair[0] when followed by pair[1], memoised per renderer"""
+    if pair not in advances:
+        advances[pair] = font.getlength(pair) - font.getlength(pair[1])
+    return advances[pair]
+
+def _layout_text(text: str, x: int, y: int, font: ImageFont.FreeTypeFont,
+                 atlas: dict, advances: dict) -> List[Tuple[np.ndarray, int, int]]:
+    """Place atlas glyphs for text centred on (x, y) (anchor "mm"), rounding like Pillow"""
+    glyphs = [atlas[ch] if ch in atlas else atlas.setdefault(ch, _rasterize_glyph(font, ch)) for ch in text]
+    pen_advances = [_pair_advance(font, advances, text[i:i + 2]) for i in range(len(text) - 1)]
+    if glyphs:
+        pen_advances.append(glyphs[-1][3])
+    ascent, descent = font.getmetrics()
+    pen_x = x - math.floor(sum(pen_advances) / 2 + 0.5)
+    top_y = y - (ascent + descent) / 2
+    
+    placed = []
+    for (mask, left, top, _), advance in zip(glyphs, pen_advances):
+        if mask is not None:
+            placed.append((mask, math.floor(pen_x + left + 0.5), math.floor(top_y + top + 0.5)))
+        pen_x += advance
+    return placed
+
+def _blit_text(base: Image.Image, placed: List[Tuple[np.ndarray, int, int]], color: np.ndarray) -> Image.Image:
+    """Alpha-blend placed glyphs into a copy of base, touching only the text's bounding box"""
+    cert = base.copy()
+    if not placed:
+        return cert
+    
+    # Bounding box of all glyphs, clipped to the image
+    bx0 = max(min(gx for _, gx, _ in placed), 0)
+    by0 = max(min(gy for _, _, gy in placed), 0)
+    bx1 = min(max(gx + mask.shape[1] for mask, gx, _ in placed), base.width)
+    by1 = min(max(gy + mask.shape[0] for mask, _, gy in placed), base.height)
+    if bx0 >= bx1 or by0 >= by1:
+        return cert
+    
+    region = np.array(base.crop((bx0, by0, bx1, by1)), dtype=np.float32)
+    for mask, gx, gy in placed:
+        # Clip the glyph box to the region
+        x0, y0 = max(gx, bx0), max(gy, by0)
+        x1, y1 = min(gx + mask.shape[1], bx1), min(gy + mask.shape[0], by1)
+        if x0 < x1 and y0 < y1:
+            alpha = mask[y0 - gy:y1 - gy, x0 - gx:x1 - gx]
+            patch = region[y0 - by0:y1 - by0, x0 - bx0:x1 - bx0]
+            patch += (color - patch) * alpha
+    
+    cert.paste(Image.fromarray((region + 0.5).astype(np.uint8)), (bx0, by0))
+    return cert
+
+def make_renderer(
     template: Image.Image, 
-    name: str, 
     font_size: int, 
     x: int, 
     y: int, 
     font_color: str,
     add_date: bool = True
-) -> Image.Image:
-    """Simple certificate generation"""
+) -> Callable[[str], Image.Image]:
+    """Prepare everything that is identical across a batch and return a per-name renderer.
+
+    The template is decoded, fonts are loaded and the date line is drawn once;
+    each call then only copies the base image and draws the name. With a
+    TrueType font the name glyphs are rasterized once into an atlas and
+    alpha-blended with numpy over the name's bounding box, so FreeType is
+    not invoked per certificate.
+    """
+    font, date_font = load_certificate_fonts(font_size)
+    # convert() always returns a new image, so the shared decoded template stays untouched
+    base = template.convert("RGB")
     
-    cert = template.copy().convert("RGB")
-    draw = ImageDraw.Draw(cert)
+    # Add date if requested
+    if add_date:
+        date_str = f"Date: {datetime.now().strftime('%B %d, %Y')}"
+        ImageDraw.Draw(base).text((x, y + font_size + 15), date_str, fill=font_color, font=date_font, anchor="mm")
     
-    # Try to load a font, fallback to default
-    try:
-        # Use a more common default font if arial.ttf is not found on all systems
-        font = ImageFont.truetype("arial.ttf", font_size) 
-    except IOError:
-        try:
-            # Fallback to a common system font, or a bundled font if available
-            font = ImageFont.truetype("LiberationSans-Regular.ttf", font_size) # Example common Linux font
-        except IOError:
-            font = ImageFont.load_default()
-            # Try to make it bigger if possible
-            if hasattr(font, 'font_variant'):
-                try:
-                    font = font.font_variant(size=font_size)
-                except:
-                    pass # Fallback to default size if font_variant fails
+    if not isinstance(font, ImageFont.FreeTypeFont):
+        # Bitmap fallback font: no glyph metrics to build an atlas from
+        def render(name: str) -> Image.Image:
+            cert = base.copy()
+            # Draw the name
+            ImageDraw.Draw(cert).text((x, y), name, fill=font_color, font=font, anchor="mm")
+            return cert
+        
+        return render
     
-    # Draw the name
-    draw.text((x, y), name, fill=font_color, font=font, anchor="mm")
+    color = np.array(ImageColor.getrgb(font_color)[:3], dtype=np.float32)
+    atlas = {ch: _rasterize_glyph(font, ch) for ch in _GLYPH_ATLAS_CHARS}
+    advances = {}
+    
+    def render(name: str) -> Image.Image:
+        # Draw the name
+        return _blit_text(base, _layout_text(name, x, y, font, atlas, advances), color)
     
+    return render
+
+def generate_simple_certificate(
+    template: Image.Image, 
+    name: str, 
+    font_size: int, 
+    x: int, 
+    y: int, 
+    font_color: str,
+    add_date: bool = True
+) -> Image.Image:
+    """Simple certificate generation, for a single name such as the live preview.
+
+    Draws directly with ImageDraw: building a make_renderer atlas costs more than it saves
+    for one certificate, and the atlas renders the same pixels.
+    """
+    font, date_font = load_certificate_fonts(font_size)
+    cert = template.convert("RGB")
+    draw = ImageDraw.Draw(cert)
     # Add date if requested
     if add_date:
         date_str = f"Date: {datetime.now().strftime('%B %d, %Y')}"
-        try:
-            date_font = ImageFont.truetype("arial.ttf", max(16, font_size // 3))
-        except IOError:
-            try:
-                date_font = ImageFont.truetype("LiberationSans-Regular.ttf", max(16, font_size // 3))
-            except IOError:
-                date_font = font # Fallback to the main font if date font fails
-        
         draw.text((x, y + font_size + 15), date_str, fill=font_color, font=date_font, anchor="mm")
-    
+    # Draw the name
+    draw.text((x, y), name, fill=font_color, font=font, anchor="mm")
     return cert
 
+def render_certificate_png(name: str, renderer: Callable[[str], Image.Image]) -> Tuple[str, bytes]:
+    """Render one certificate and return its ZIP filename and PNG bytes"""
+    cert = renderer(name)
+    img_bytes = io.BytesIO()
+    # Fast deflate: these PNGs are mostly flat template pixels
+    cert.save(img_bytes, format='PNG', compress_level=1)
+    safe_name = _SAFE_NAME_RE.sub('', name).replace(' ', '_')
+    return f"{safe_name}_certificate.png", img_bytes.getvalue()
+
+def render_certificates(names: List[str], progress_bar, renderer: Callable[[str], Image.Image]) -> dict:
+    """Render certificates in parallel, keeping the input name order.
+
+    Pillow releases the GIL while encoding PNGs, so a thread pool scales with
+    cores without having to pickle the template into worker processes.
+    """
+    results = [None] * len(names)
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = {
+            executor.submit(render_certificate_png, name, renderer): i
+            for i, name in enumerate(names)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            progress_bar.progress(done / len(names))
+    return dict(results)
+
+def zip_certificates(certificates: dict) -> bytes:
+    """Pack certificates into an in-memory ZIP for download.
+
+    Entries are stored, since PNGs are already deflate-compressed. The buffer
+    is local, so getvalue() hands over its storage instead of keeping a second
+    copy of the archive alive for the rest of the script run.
+    """
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_STORED) as zip_file:
+        for filename, cert_data in certificates.items():
+            zip_file.writestr(filename, cert_data)
+    return zip_buffer.getvalue()
+
 # --- Streamlit UI ---
 
 st.subheader("📄 Step 1: Upload Certificate Template")
@@ -242,11 +520,12 @@ template_file = st.file_uploader(
     help="This will be the background for your certificates"
 )
 
-st.subheader("📷 Step 2: Upload Image with Names")
-uploaded_file = st.file_uploader(
-    "Upload image containing names to extract", 
+st.subheader("📷 Step 2: Upload Images with Names")
+uploaded_files = st.file_uploader(
+    "Upload images containing names to extract", 
     type=["png", "jpg", "jpeg"],
-    help="Upload a clear image with names you want to extract"
+    accept_multiple_files=True,
+    help="Upload one or more clear images with names you want to extract"
 )
 
 # Show settings
@@ -263,23 +542,23 @@ with col2:
                                      help="Higher = more strict detection for NER model")
 
 # Process if both files are uploaded
-if uploaded_file and template_file:
+if uploaded_files and template_file:
     
     # Check if models loaded
     if not ocr_reader:
         st.error("❌ OCR model failed to load. Please refresh the page.")
         st.stop()
     
-    # Display uploaded image
-    image = Image.open(uploaded_file)
-    st.image(image, caption="Uploaded Image", width=400)
+    # Display uploaded images
+    images = [Image.open(f) for f in uploaded_files]
+    st.image(images, caption=[f.name for f in uploaded_files], width=400)
     
-    # Process the image
+    # Process the images
     st.subheader("🔍 Step 4: Extract Names")
     
-    with st.spinner("Processing image and extracting names..."):
+    with st.spinner("Processing images and extracting names..."):
         # Pass confidence_threshold to run_simple_ocr
-        extracted_text, found_names = run_simple_ocr(image, ocr_reader, ner_pipeline, confidence_threshold)
+        extracted_text, found_names = run_simple_ocr([f.getvalue() for f in uploaded_files], confidence_threshold)
     
     # Show results
     st.write("**Extracted Text:**")
@@ -298,7 +577,7 @@ if uploaded_file and template_file:
         if selected_names:
             # Position controls
             st.subheader("📍 Step 5: Position Text")
-            template_preview = Image.open(template_file)
+            template_preview = decode_template(template_file.getvalue())
             template_width, template_height = template_preview.size
             
             col1, col2 = st.columns(2)
@@ -318,24 +597,10 @@ if uploaded_file and template_file:
             st.subheader("🎓 Step 6: Generate Certificates")
             
             if st.button("Generate All Certificates", type="primary"):
-                certificates = {}
                 progress_bar = st.progress(0)
                 
-                for i, name in enumerate(selected_names):
-                    # Generate certificate
-                    template = Image.open(template_file)
-                    cert = generate_simple_certificate(
-                        template, name, font_size, x_pos, y_pos, font_color, add_date
-                    )
-                    
-                    # Save to memory
-                    img_bytes = io.BytesIO()
-                    cert.save(img_bytes, format='PNG')
-                    safe_name = re.sub(r'[^\w\s-]', '', name).replace(' ', '_')
-                    certificates[f"{safe_name}_certificate.png"] = img_bytes.getvalue()
-                    
-                    # Update progress
-                    progress_bar.progress((i + 1) / len(selected_names))
+                renderer = make_renderer(template_preview, font_size, x_pos, y_pos, font_color, add_date)
+                certificates = render_certificates(selected_names, progress_bar, renderer)
                 
                 st.success("✅ All certificates generated!")
                 
@@ -354,28 +619,23 @@ if uploaded_file and template_file:
 
                 # Create download ZIP
                 if certificates:
-                    zip_buffer = io.BytesIO()
-                    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-                        for filename, cert_data in certificates.items():
-                            zip_file.writestr(filename, cert_data)
-                    
                     st.download_button(
                         label="📥 Download All Certificates (ZIP)",
-                        data=zip_buffer.getvalue(),
+                        data=zip_certificates(certificates),
                         file_name=f"certificates_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
                         mime="application/zip"
                     )
         else:
             st.info("No names selected for certificate generation.")
     else:
-        st.warning("⚠️ No names were detected in the image.")
+        st.warning("⚠️ No names were detected in the images.")
         st.write("**Tips to improve detection:**")
         st.write("- Use a clearer, higher resolution image")
         st.write("- Ensure names are clearly visible and not handwritten")
         st.write("- Try lowering the 'Name Detection Sensitivity' slider (Step 3)")
         st.write("- Make sure the image contains actual names (not just random text)")
 
-elif not uploaded_file or not template_file:
+elif not uploaded_files or not template_file:
     st.info("👆 Please upload both files to get started!")
 
 # Add manual name entry option
@@ -395,7 +655,7 @@ if manual_names_text and template_file:
         st.write(f"**Manual names entered:** {len(manual_names)}")
         
         # Use same positioning controls
-        template_preview = Image.open(template_file)
+        template_preview = decode_template(template_file.getvalue())
         template_width, template_height = template_preview.size
         
         col1, col2 = st.columns(2)
@@ -405,21 +665,10 @@ if manual_names_text and template_file:
             manual_y = st.slider("Vertical Position (Manual)", 0, template_height, template_height // 2, key="manual_y")
         
         if st.button("Generate Certificates from Manual Names", type="primary"):
-            manual_certificates = {}
             progress_bar = st.progress(0)
             
-            for i, name in enumerate(manual_names):
-                template = Image.open(template_file)
-                cert = generate_simple_certificate(
-                    template, name, font_size, manual_x, manual_y, font_color, add_date
-                )
-                
-                img_bytes = io.BytesIO()
-                cert.save(img_bytes, format='PNG')
-                safe_name = re.sub(r'[^\w\s-]', '', name).replace(' ', '_')
-                manual_certificates[f"{safe_name}_certificate.png"] = img_bytes.getvalue()
-                
-                progress_bar.progress((i + 1) / len(manual_names))
+            renderer = make_renderer(template_preview, font_size, manual_x, manual_y, font_color, add_date)
+            manual_certificates = render_certificates(manual_names, progress_bar, renderer)
             
             st.success("✅ Manual certificates generated!")
             
@@ -437,14 +686,9 @@ if manual_names_text and template_file:
 
             # Download option
             if manual_certificates:
-                zip_buffer = io.BytesIO()
-                with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
-                    for filename, cert_data in manual_certificates.items():
-                        zip_file.writestr(filename, cert_data)
-                
                 st.download_button(
                     label="📥 Download Manual Certificates (ZIP)",
-                    data=zip_buffer.getvalue(),
+                    data=zip_certificates(manual_certificates),
                     file_name=f"manual_certificates_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
                     mime="application/zip"
                 )
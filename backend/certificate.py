@@ -1,177 +1,894 @@
+import collections
+import io
+import logging
 import os
+import functools
+import hashlib
+import importlib.util
+import itertools
+import multiprocessing
+import shutil
+import subprocess
+import tempfile
+import threading
 import pandas as pd
-from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+from backend.config import CERT_OUTPUT_DIR, CERT_RENDER_WORKERS
 from backend.logger import get_logger
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.lib.colors import Color, toColor
 from pdfrw import PdfReader, PdfWriter, PageMerge
 import json
 
+try:
+    # orjson parses several times faster when installed; the stdlib is the fallback
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
+
 logger = get_logger()
 
+# Accepted header spellings (after lowercasing and replacing spaces with underscores)
+COLUMN_MAPPING = {
+    'name': ['name', 'student_name', 'full_name'],
+    'email': ['email', 'email_id', 'email_address'],
+    'year_of_study': ['year_of_study', 'year', 'academic_year'],
+    'branch': ['branch', 'department', 'course']
+}
+REQUIRED_COLUMNS = ['name', 'email', 'year_of_study', 'branch']
+# Flat lookup from every accepted spelling to its standard column name
+_VARIATION_TO_STANDARD = {variation: standard for standard, variations in COLUMN_MAPPING.items() for variation in variations}
+# Rows per batch when streaming a roster with iter_students
+STREAM_CHUNK_SIZE = 5000
+# Certificates handed to a pool worker per submit, so the config and layout are pickled once per batch
+JOB_BATCH_SIZE = 16
+# File signatures: .xlsx/.xlsm are zip archives, legacy .xls is an OLE2 compound document
+_XLSX_MAGIC = b"PK\x03\x04"
+_XLS_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+# calamine (Rust) reads both formats and is much faster, but is optional, and older pandas
+# (< 2.2) has no engine for it even when python-calamine is installed
+_HAS_CALAMINE = (importlib.util.find_spec("python_calamine") is not None
+                 and tuple(int(part) for part in pd.__version__.split(".")[:2]) >= (2, 2))
+
+class _SafeNameTable(dict):
+    """str.translate table keeping alphanumerics, space, '-' and '_' and deleting everything else.
+
+    Code points are classified on first use and cached, so it covers all of Unicode
+    (str.isalnum semantics) without building a full table up front.
+    """
+    def __missing__(self, codepoint: int) -> Optional[int]:
+        ch = chr(codepoint)
+        self[codepoint] = codepoint if ch.isalnum() or ch in ' -_' else None
+        return self[codepoint]
+
+
+_SAFE_NAME_TABLE = _SafeNameTable()
+
+
+class _TextStyle(NamedTuple):
+    """Placement and styling of one overlay string, with the config defaults filled in."""
+    x: float
+    y: float
+    font: str
+    size: float
+    color: Union[Color, str]
+
+
+class _OverlayLayout(NamedTuple):
+    """The drawable part of a certificate config, resolved once per batch by _overlay_layout."""
+    title: Optional[_TextStyle]
+    fields: Tuple[Tuple[str, _TextStyle], ...]
+
+# Process pool shared by all batches in this process (see get_process_pool)
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+# Custom font names this process has already registered (or failed to), see _register_custom_fonts
+_registered_fonts = set()
+# Recently parsed rosters by content digest, so re-processing the same sheet (e.g. a retry
+# after fixing email credentials) skips the parse; see iter_students
+ROSTER_CACHE_SIZE = 8
+_roster_cache: "collections.OrderedDict[str, List[Dict]]" = collections.OrderedDict()
+_roster_cache_lock = threading.Lock()
+# Certificates already written, by a digest of everything that is drawn on them, with the
+# (path, mtime_ns, size) they were written with; see generate_all_certificates
+CERTIFICATE_CACHE_SIZE = 10000
+_certificate_cache: "collections.OrderedDict[str, Tuple[str, int, int]]" = collections.OrderedDict()
+_certificate_cache_lock = threading.Lock()
+
 class CertificateGenerator:
     def __init__(self, template_path: str = r'./'):
         self.template_path = template_path
-        self.output_dir = "../generated_certificates"
-        os.makedirs(self.output_dir, exist_ok=True)
+        # Absolute and created once at import by backend.config, so pool workers agree on it
+        self.output_dir = CERT_OUTPUT_DIR
 
     def parse_excel_csv(self, excel_path: str) -> List[Dict]:
         """Parse Excel or CSV file and return list of student records."""
         try:
-            logger.info(f"Attempting to parse file: {excel_path}")
+            logger.info("Attempting to parse file: %s", excel_path)
             
             # Check if file exists and get basic info
             if not os.path.exists(excel_path):
                 raise FileNotFoundError(f"File not found: {excel_path}")
             
-            file_size = os.path.getsize(excel_path)
-            logger.info(f"File size: {file_size} bytes")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("File size: %d bytes", os.path.getsize(excel_path))
             
-            # Determine file type and read accordingly
+            # Determine file type; read only the header first so the full read can be
+            # limited to the columns we need
             if excel_path.lower().endswith('.csv'):
                 logger.info("Reading as CSV file")
-                df = pd.read_csv(excel_path)
+                read_table = functools.partial(pd.read_csv, excel_path)
+                header = read_table(nrows=0)
             else:
                 logger.info("Reading as Excel file")
-                # For Excel files, try different engines if one fails
-                try:
-                    df = pd.read_excel(excel_path, engine='openpyxl')
-                except Exception as openpyxl_error:
-                    logger.error(f"Failed with openpyxl engine: {openpyxl_error}")
-                    try:
-                        df = pd.read_excel(excel_path, engine='xlrd')
-                    except Exception as xlrd_error:
-                        logger.error(f"Failed with xlrd engine: {xlrd_error}")
-                        # If it's truly corrupted, raise a clear error
-                        raise ValueError(f"Cannot read Excel file. File may be corrupted. Original errors: openpyxl: {openpyxl_error}, xlrd: {xlrd_error}")
-            
-            logger.info(f"Successfully read file with {len(df)} rows and {len(df.columns)} columns")
-            
-            # Normalize column names (handle variations and formatting)
-            df.columns = [col.lower().replace(" ", "_").strip() for col in df.columns]
-            column_mapping = {
-                'name': ['name', 'student_name', 'full_name'],
-                'email': ['email', 'email_id', 'email_address'],
-                'year_of_study': ['year_of_study', 'year', 'academic_year'],
-                'branch': ['branch', 'department', 'course']
-            }
-            normalized_columns = {}
-            for standard_name, variations in column_mapping.items():
-                for col in df.columns:
-                    if col in [v.lower().replace(" ", "_").strip() for v in variations]:
-                        normalized_columns[col] = standard_name
-                        break
-            df = df.rename(columns=normalized_columns)
+                read_table, header = self._probe_excel(excel_path)
             
-            # Validate required columns
-            required_cols = ['name', 'email', 'year_of_study', 'branch']
-            missing_cols = [col for col in required_cols if col not in df.columns]
-            if missing_cols:
-                raise ValueError(f"Missing required columns: {missing_cols}. Accepted variations: {column_mapping}")
+            source_columns = _resolve_columns(header.columns)
             
-            # Convert to list of dictionaries
-            students = df[required_cols].to_dict('records')
+            # Read just the required columns, as text
+            df = read_table(usecols=[source_columns[col] for col in REQUIRED_COLUMNS], dtype=str)
+            logger.info("Successfully read file with %d rows (%d columns, %d used)", len(df), len(header.columns), len(REQUIRED_COLUMNS))
+            students = _clean_records(df, source_columns)
             
-            # Clean data
-            for student in students:
-                for key, value in student.items():
-                    if pd.isna(value):
-                        student[key] = ""
-                    else:
-                        student[key] = str(value).strip()
-            
-            logger.info(f"Successfully parsed {len(students)} student records")
+            logger.info("Successfully parsed %d student records", len(students))
             return students
             
         except Exception as e:
-            logger.error(f"Error parsing Excel file: {e}")
+            logger.error("Error parsing Excel file: %s", e)
             raise
     
-    def _register_custom_fonts(self, config):
-        """Register custom fonts from config if not already registered."""
-        for font in config.get('custom_fonts', []):
+    def iter_students(self, excel_path: str, chunksize: int = STREAM_CHUNK_SIZE) -> Iterator[Dict]:
+        """Yield student records from an Excel or CSV file without loading it all at once.
+
+        CSV files are read in chunks and .xlsx/.xlsm files are streamed row by row with
+        openpyxl in read-only mode, so parsing memory stays proportional to chunksize. Other
+        formats (.xls) cannot be streamed and are parsed whole with parse_excel_csv.
+        Fully read rosters are kept (up to ROSTER_CACHE_SIZE, keyed by a digest of the file
+        contents) and replayed without parsing when the same file is read again.
+        """
+        # The extension picks the parser, so it is part of the key
+        digest = _file_digest(excel_path) + os.path.splitext(excel_path)[1].lower()
+        with _roster_cache_lock:
+            cached = _roster_cache.get(digest)
+            if cached is not None:
+                _roster_cache.move_to_end(digest)
+        if cached is not None:
+            logger.info("Reusing %d parsed student records for %s", len(cached), excel_path)
+            yield from cached
+            return
+        students = []
+        for student in self._stream_students(excel_path, chunksize):
+            students.append(student)
+            yield student
+        # Only reached when the whole file was read without errors
+        with _roster_cache_lock:
+            _roster_cache[digest] = students
+            while len(_roster_cache) > ROSTER_CACHE_SIZE:
+                _roster_cache.popitem(last=False)
+    
+    def _stream_students(self, excel_path: str, chunksize: int) -> Iterator[Dict]:
+        try:
+            if not os.path.exists(excel_path):
+                raise FileNotFoundError(f"File not found: {excel_path}")
+            
+            lower_path = excel_path.lower()
+            if lower_path.endswith('.csv'):
+                logger.info("Streaming CSV file: %s", excel_path)
+                source_columns = _resolve_columns(pd.read_csv(excel_path, nrows=0).columns)
+                usecols = [source_columns[col] for col in REQUIRED_COLUMNS]
+                with pd.read_csv(excel_path, usecols=usecols, dtype=str, chunksize=chunksize) as reader:
+                    for chunk in reader:
+                        yield from _clean_records(chunk, source_columns)
+            elif lower_path.endswith(('.xlsx', '.xlsm')) and _sniff_excel_format(excel_path) == 'xlsx':
+                logger.info("Streaming Excel file: %s", excel_path)
+                yield from self._iter_xlsx_students(excel_path, chunksize)
+            else:
+                yield from self.parse_excel_csv(excel_path)
+        except Exception as e:
+            logger.error("Error streaming student file: %s", e)
+            raise
+    
+    def _iter_xlsx_students(self, excel_path: str, chunksize: int) -> Iterator[Dict]:
+        """Stream an .xlsx roster with openpyxl's read-only reader, cleaning chunksize rows at a time."""
+        import openpyxl
+        
+        workbook = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, ())
+            source_columns = _resolve_columns(range(len(header)), names=header)
+            positions = [source_columns[col] for col in REQUIRED_COLUMNS]
+            batch = []
+            for row in rows:
+                if not any(value is not None for value in row):
+                    continue  # Skip blank rows
+                batch.append(["" if pos >= len(row) or row[pos] is None else str(row[pos]) for pos in positions])
+                if len(batch) >= chunksize:
+                    yield from _clean_records(pd.DataFrame(batch, columns=positions), source_columns)
+                    batch = []
+            if batch:
+                yield from _clean_records(pd.DataFrame(batch, columns=positions), source_columns)
+        finally:
+            workbook.close()
+    
+    def _probe_excel(self, excel_path: str):
+        """Read the Excel header with the first engine that can open the file.
+
+        The engines to try are picked from the file's magic bytes (see _excel_engines), so
+        the usual case opens on the first attempt. Returns a pd.read_excel partial bound to
+        that engine, plus the header-only frame.
+        """
+        errors = []
+        for engine in _excel_engines(excel_path):
             try:
-                font_file = os.path.join(os.path.dirname(__file__), font['file'])
-                if os.path.exists(font_file) and font['name'] not in pdfmetrics.getRegisteredFontNames():
-                    pdfmetrics.registerFont(TTFont(font['name'], font_file))
-            except Exception as e:
-                logger.warning(f"Could not register font {font['name']}: {e}")
+                read_table = functools.partial(pd.read_excel, excel_path, engine=engine)
+                return read_table, read_table(nrows=0)
+            except Exception as engine_error:
+                logger.warning("Failed with %s engine: %s", engine, engine_error)
+                errors.append(f"{engine}: {engine_error}")
+        # If it's truly corrupted, raise a clear error
+        raise ValueError(f"Cannot read Excel file. File may be corrupted. Original errors: {', '.join(errors)}")
+
+    def generate_all_certificates(self, students: Iterable[Dict], config_path: Optional[str] = None,
+                                  max_workers: Optional[int] = None,
+                                  progress: Optional[Callable[[int], None]] = None,
+                                  output_dir: Optional[str] = None) -> List[str]:
+        """Generate certificates for all students using configuration-based layout.
+
+        Each certificate is independent and CPU-bound, so they are rendered in a process pool:
+        the shared pool from get_process_pool() by default, or a dedicated pool of max_workers
+        processes (capped at the shared pool's size). The config is loaded once here and passed to the jobs. students may be a
+        generator such as iter_students(); jobs are submitted in batches of up to JOB_BATCH_SIZE
+        as records arrive, with at most two batches per worker in flight, so rendering overlaps
+        with parsing and memory stays flat. If given, progress is called with the number of
+        certificates finished so far each time a batch completes. Certificates are written to
+        output_dir (created if needed), by default the shared self.output_dir.
+
+        Students whose drawn fields match a certificate written earlier (a duplicate row, or a
+        retry of the same roster) get a link or copy of that file instead of a fresh render.
+        """
+        config = load_certificate_config(config_path)
+        layout = _overlay_layout(config)
+        config_digest = _config_digest(config)
+        output_dir = output_dir or self.output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        workers = CERT_RENDER_WORKERS or os.cpu_count() or 1
+        if max_workers:
+            # A dedicated pool never gets more processes than the shared one may have
+            max_workers = workers = min(max_workers, workers)
+        batch_size = JOB_BATCH_SIZE
+        if hasattr(students, '__len__'):
+            # Small rosters get smaller batches so every worker still has something to do
+            batch_size = max(1, min(batch_size, len(students) // workers))
+        # Keys are looked up as batches are submitted, so certificates collected by then are reused
+        jobs = (
+            (i, student, self._certificate_path(student, i, output_dir), key, _cached_certificate(key))
+            for i, student in enumerate(students)
+            for key in (_render_key(config_digest, layout, student),)
+        )
+        batches = ((config, layout, batch) for batch in _batched(jobs, batch_size))
+        window = 2 * workers
+        if max_workers:
+            with _new_process_pool(max_workers) as executor:
+                return _collect_paths(_map_bounded(executor, batches, window), progress)
+        pool = get_process_pool()
+        try:
+            return _collect_paths(_map_bounded(pool, batches, window), progress)
+        except BrokenProcessPool:
+            # A worker died (OOM kill, crash); drop the pool so the next call starts a fresh one
+            _discard_process_pool(pool)
+            raise
+
+    def generate_all_certificates_combined(self, students: Iterable[Dict], output_path: Optional[str] = None,
+                                           config_path: Optional[str] = None) -> str:
+        """Generate every student's certificate as consecutive pages of a single PDF.
 
-    def generate_all_certificates(self, students: List[Dict], config_path: Optional[str] = None) -> List[str]:
-        """Generate certificates for all students using configuration-based layout."""
-        generated_files = []
-        for i, student in enumerate(students):
+        All overlays are drawn on one multi-page canvas and parsed once. Each page is built
+        over the template with PageMerge, which turns the template page into a single shared
+        form XObject, so the template and its fonts are written once rather than per student.
+        """
+        from reportlab.pdfgen import canvas
+        from reportlab.lib.pagesizes import A4
+        if output_path is None:
+            output_path = os.path.join(self.output_dir, "certificates_combined.pdf")
+        config = load_certificate_config(config_path)
+        _register_custom_fonts(config)
+        layout = _overlay_layout(config)
+        
+        overlay_buffer = io.BytesIO()
+        c = canvas.Canvas(overlay_buffer, pagesize=A4, pageCompression=1)
+        drawn_pages = []
+        for student in students:
+            drawn_pages.append(_draw_overlay(c, student, layout))
+            c.showPage()
+        if not drawn_pages:
+            raise ValueError("No students to generate certificates for")
+        c.save()
+        overlay_pages = PdfReader(fdata=overlay_buffer.getvalue()).pages
+        
+        template_path = config.get("template_path", "backend/template.pdf")
+        template_mtime = _template_mtime(template_path)
+        template_pages = []
+        if template_mtime is not None:
             try:
-                safe_name = "".join(c for c in student['name'] if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                filename = f"certificate_{safe_name}_{i+1}.pdf"
-                output_path = os.path.join(self.output_dir, filename)
-                self.generate_certificate_with_config(student, output_path, config_path)
-                generated_files.append(output_path)
+                template_pages = _parse_template(template_path, template_mtime).pages or []
             except Exception as e:
-                logger.error(f"Failed to generate config-based certificate for student {i+1}: {e}")
+                logger.warning("Template read failed: %s, using overlays only", e)
+        
+        # Written beside the target and swapped in, so readers never see a partial PDF
+        temp_path = output_path + ".tmp"
+        writer = PdfWriter(temp_path)
+        for overlay_page, drawn in zip(overlay_pages, drawn_pages):
+            if not template_pages:
+                writer.addpage(overlay_page)
                 continue
-        return generated_files
+            # Same layout as the per-student files: overlay on the first template page
+            for page_index, template_page in enumerate(template_pages):
+                merger = PageMerge().add(template_page)
+                if page_index == 0 and drawn:
+                    merger.add(overlay_page)
+                writer.addpage(merger.render())
+        writer.write()
+        os.replace(temp_path, output_path)
+        logger.info("Combined certificate PDF with %d certificates written to %s", len(drawn_pages), output_path)
+        return output_path
+
+    def _certificate_path(self, student: Dict, index: int, output_dir: Optional[str] = None) -> str:
+        """Output path for the index-th student's certificate, in output_dir or self.output_dir."""
+        safe_name = student['name'].translate(_SAFE_NAME_TABLE).rstrip()
+        filename = f"certificate_{safe_name}_{index+1}.pdf"
+        return os.path.join(output_dir or self.output_dir, filename)
 
     def generate_certificate_with_config(self, student_data: Dict, output_path: str, config_path: Optional[str] = None) -> str:
         """Generate a certificate PDF using the configuration file for layout and styling."""
         try:
-            if config_path is None:
-                config_path = os.path.join(os.path.dirname(__file__), 'certificate_config.json')
-            if not os.path.exists(config_path):
-                logger.warning(f"Config file not found: {config_path}")
-                raise FileNotFoundError(f"Config file not found: {config_path}")
-            with open(config_path, 'r') as f:
-                config = json.load(f)
-            self._register_custom_fonts(config)
-            from reportlab.pdfgen import canvas
-            from reportlab.lib.pagesizes import A4
-            temp_pdf_path = output_path + ".temp.pdf"
-            c = canvas.Canvas(temp_pdf_path, pagesize=A4)
-            # Draw title if configured
-            title_cfg = config.get("title", {})
-            if title_cfg.get("x") and title_cfg.get("y"):
-                try:
-                    c.setFont(title_cfg.get("font", "Helvetica-Bold"), title_cfg.get("size", 24))
-                except:
-                    logger.warning(f"Font {title_cfg.get('font')} not available, using Helvetica-Bold")
-                    c.setFont("Helvetica-Bold", title_cfg.get("size", 24))
-                c.setFillColor(title_cfg.get("color", "#000000"))
-                c.drawCentredString(title_cfg.get("x", 300), title_cfg.get("y", 500), "CERTIFICATE OF COMPLETION")
-            # Draw each configured field
-            fields_config = config.get("fields", {})
-            for field_name, field_cfg in fields_config.items():
-                value = student_data.get(field_name, "")
-                if value and field_cfg.get("x") and field_cfg.get("y"):
-                    try:
-                        c.setFont(field_cfg.get("font", "Helvetica"), field_cfg.get("size", 14))
-                    except:
-                        logger.warning(f"Font {field_cfg.get('font')} not available, using Helvetica")
-                        c.setFont("Helvetica", field_cfg.get("size", 14))
-                    c.setFillColor(field_cfg.get("color", "#000000"))
-                    c.drawCentredString(field_cfg.get("x", 300), field_cfg.get("y", 400), str(value))
-            c.save()
-            # Try to merge with template if available
-            template_path = config.get("template_path", "backend/template.pdf")
-            if template_path and os.path.exists(template_path):
+            config = load_certificate_config(config_path)
+            _register_custom_fonts(config)
+            return _render_certificate(student_data, output_path, config, _overlay_layout(config))
+        except Exception as e:
+            logger.error("Error generating config-based certificate for %s: %s", student_data['name'], e)
+            raise
+
+
+def _file_digest(path: str) -> str:
+    """BLAKE2b hex digest of a file's contents, read in 1 MiB blocks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while block := f.read(1024 * 1024):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _config_digest(config: Dict) -> str:
+    """Digest of the config and the template's mtime: the inputs every certificate of a run shares."""
+    template_mtime = _template_mtime(config.get("template_path", "backend/template.pdf"))
+    payload = json.dumps([config, template_mtime], sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _render_key(config_digest: str, layout: _OverlayLayout, student: Dict) -> str:
+    """Digest of everything drawn on a student's certificate; equal keys mean identical certificates."""
+    digest = hashlib.blake2b(config_digest.encode("ascii"), digest_size=16)
+    for field_name, _ in layout.fields:
+        value = student.get(field_name, "")
+        # Same truthiness test as _draw_overlay, with a separator so field boundaries count
+        digest.update(b"\x00" + (str(value) if value else "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _cached_certificate(key: str) -> Optional[str]:
+    """Path of a certificate written for key, if it is still on disk unchanged (not cleaned up or replaced)."""
+    with _certificate_cache_lock:
+        entry = _certificate_cache.get(key)
+    if entry is None:
+        return None
+    path, mtime_ns, size = entry
+    try:
+        stat = os.stat(path)
+    except OSError:
+        stat = None
+    if stat is None or (stat.st_mtime_ns, stat.st_size) != (mtime_ns, size):
+        with _certificate_cache_lock:
+            if _certificate_cache.get(key) == entry:
+                del _certificate_cache[key]
+        return None
+    return path
+
+
+def _remember_certificate(key: str, path: str) -> None:
+    """Record a freshly written certificate for _cached_certificate, evicting the oldest entries."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return
+    with _certificate_cache_lock:
+        _certificate_cache[key] = (path, stat.st_mtime_ns, stat.st_size)
+        _certificate_cache.move_to_end(key)
+        while len(_certificate_cache) > CERTIFICATE_CACHE_SIZE:
+            _certificate_cache.popitem(last=False)
+
+
+def _resolve_columns(columns: Iterable, names: Optional[Iterable] = None) -> Dict:
+    """Map each required column to its key in the source table, matching COLUMN_MAPPING variations.
+
+    names gives the header text when it differs from the keys (e.g. positional keys).
+    """
+    columns = list(columns)
+    names = columns if names is None else list(names)
+    source_columns = {}
+    for col, col_name in zip(columns, names):
+        standard_name = _VARIATION_TO_STANDARD.get(str(col_name).lower().replace(" ", "_").strip())
+        if standard_name:
+            source_columns.setdefault(standard_name, col)  # First matching column wins
+    
+    # Validate required columns
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in source_columns]
+    if missing_cols:
+        raise ValueError(f"Missing required columns: {missing_cols}. Accepted variations: {COLUMN_MAPPING}")
+    return source_columns
+
+
+def _clean_records(df: pd.DataFrame, source_columns: Dict) -> List[Dict]:
+    """Rename source columns to the standard names, strip text in one vectorized pass and return records."""
+    df_out = df[[source_columns[col] for col in REQUIRED_COLUMNS]]
+    df_out.columns = REQUIRED_COLUMNS
+    df_out = df_out.fillna("").apply(lambda col: col.str.strip())
+    return df_out.to_dict('records')
+
+
+def _sniff_excel_format(excel_path: str) -> Optional[str]:
+    """Return 'xlsx' or 'xls' from the file's magic bytes, or None if it is neither."""
+    with open(excel_path, 'rb') as f:
+        magic = f.read(len(_XLS_MAGIC))
+    if magic.startswith(_XLSX_MAGIC):
+        return 'xlsx'
+    if magic == _XLS_MAGIC:
+        return 'xls'
+    return None
+
+
+def _excel_engines(excel_path: str) -> List[str]:
+    """pd.read_excel engines to try for a file, in order.
+
+    Only the engine matching the detected format is tried after calamine; a file that
+    matches neither signature gets every engine as a last resort.
+    """
+    fmt = _sniff_excel_format(excel_path)
+    engines = ['calamine'] if _HAS_CALAMINE else []
+    if fmt == 'xlsx':
+        engines.append('openpyxl')
+    elif fmt == 'xls':
+        engines.append('xlrd')
+    else:
+        engines += ['openpyxl', 'xlrd']
+    return engines
+
+
+def load_certificate_config(config_path: Optional[str] = None) -> Dict:
+    """Load the certificate layout config (defaults to certificate_config.json next to this module).
+
+    The parsed dict is cached until the file changes and shared between callers, so treat it as read-only.
+    """
+    if config_path is None:
+        config_path = os.path.join(os.path.dirname(__file__), 'certificate_config.json')
+    try:
+        mtime_ns = os.stat(config_path).st_mtime_ns
+    except FileNotFoundError:
+        logger.warning("Config file not found: %s", config_path)
+        raise FileNotFoundError(f"Config file not found: {config_path}")
+    return _load_config_cached(config_path, mtime_ns)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_config_cached(config_path: str, mtime_ns: int) -> Dict:
+    """Parse the config JSON; the mtime in the key makes edits take effect on the next load."""
+    with open(config_path, 'rb') as f:
+        return _json_loads(f.read())
+
+
+def _new_process_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Process pool for certificate rendering.
+
+    Workers are spawned rather than forked, since the API server forks from a threaded process.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                               mp_context=multiprocessing.get_context("spawn"))
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the process-wide rendering pool, creating it on first use.
+
+    Sharing one pool keeps concurrent batches from each spawning a full set of workers. Its
+    size is CERT_RENDER_WORKERS, one process per CPU by default.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = _new_process_pool(CERT_RENDER_WORKERS)
+        return _process_pool
+
+
+def _discard_process_pool(pool: ProcessPoolExecutor) -> None:
+    """Forget a broken shared pool, unless another caller already replaced it."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_process_pool() -> None:
+    """Shut down the shared rendering pool, if it was started."""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown()
+            _process_pool = None
+
+
+def _register_custom_fonts(config: Dict) -> None:
+    """Register custom fonts from config if not already registered.
+
+    ReportLab's font registry is per process, so pool workers call this for every job;
+    once a font has been handled it costs a single set lookup.
+    """
+    for font in config.get('custom_fonts', []):
+        if font['name'] in _registered_fonts:
+            continue
+        try:
+            font_file = os.path.join(os.path.dirname(__file__), font['file'])
+            if not os.path.exists(font_file):
+                continue  # Not recorded, so a font file added later is still picked up
+            if font['name'] not in pdfmetrics.getRegisteredFontNames():
+                pdfmetrics.registerFont(TTFont(font['name'], font_file))
+        except Exception as e:
+            logger.warning("Could not register font %s: %s", font['name'], e)
+        # Record failures too, so a broken font is reported once per process, not per certificate
+        _registered_fonts.add(font['name'])
+
+
+@functools.lru_cache(maxsize=4)
+def _read_template_bytes(template_path: str, mtime_ns: int) -> bytes:
+    """Raw template bytes, cached per process; the mtime in the key picks up edited templates."""
+    with open(template_path, 'rb') as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_template(template_path: str, mtime_ns: int) -> PdfReader:
+    """Parsed template, cached per process alongside its raw bytes.
+
+    The reader is shared by every certificate this process renders, so callers must
+    build new pages (PageMerge() without a base page) instead of mutating its pages.
+    """
+    return PdfReader(fdata=_read_template_bytes(template_path, mtime_ns))
+
+
+def _template_mtime(template_path: Optional[str]) -> Optional[int]:
+    """mtime_ns of the template (the cache key above), or None if there is no template file."""
+    if not template_path:
+        return None
+    try:
+        return os.stat(template_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _write_atomic(output_path: str, data: bytes) -> None:
+    """Write data next to output_path and os.replace it in, so readers never see a partial PDF."""
+    temp_path = output_path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, output_path)
+
+
+def _overlay_layout(config: Dict) -> _OverlayLayout:
+    """Resolve the title and field styles of a config, applying defaults and dropping unplaced entries.
+
+    Done once per batch so the per-student draw loop reads tuple attributes instead of
+    repeating the dict lookups and defaults (and hex color parsing) for every certificate.
+    """
+    title = None
+    title_cfg = config.get("title", {})
+    if title_cfg.get("x") and title_cfg.get("y"):
+        title = _TextStyle(title_cfg["x"], title_cfg["y"], title_cfg.get("font", "Helvetica-Bold"),
+                           title_cfg.get("size", 24), _parse_color(title_cfg.get("color", "#000000")))
+    fields = tuple(
+        (field_name, _TextStyle(field_cfg["x"], field_cfg["y"], field_cfg.get("font", "Helvetica"),
+                                field_cfg.get("size", 14), _parse_color(field_cfg.get("color", "#000000"))))
+        for field_name, field_cfg in config.get("fields", {}).items()
+        if field_cfg.get("x") and field_cfg.get("y")
+    )
+    return _OverlayLayout(title, fields)
+
+
+def _parse_color(value: str) -> Union[Color, str]:
+    """Parse a config color once; setFillColor would otherwise re-parse the string on every call.
+
+    Unparseable values are returned as-is, so they still fail per certificate when drawn.
+    """
+    try:
+        return toColor(value)
+    except ValueError:
+        return value
+
+
+def _draw_overlay(c, student_data: Dict, layout: _OverlayLayout) -> bool:
+    """Draw the configured title and fields for one student on the current canvas page.
+
+    Returns False if nothing was drawn (no title configured and every field empty).
+    """
+    drawn = False
+    # Draw title if configured
+    title = layout.title
+    if title is not None:
+        try:
+            c.setFont(title.font, title.size)
+        except:
+            logger.warning("Font %s not available, using Helvetica-Bold", title.font)
+            c.setFont("Helvetica-Bold", title.size)
+        c.setFillColor(title.color)
+        c.drawCentredString(title.x, title.y, "CERTIFICATE OF COMPLETION")
+        drawn = True
+    # Draw each configured field
+    for field_name, style in layout.fields:
+        value = student_data.get(field_name, "")
+        if value:
+            try:
+                c.setFont(style.font, style.size)
+            except:
+                logger.warning("Font %s not available, using Helvetica", style.font)
+                c.setFont("Helvetica", style.size)
+            c.setFillColor(style.color)
+            c.drawCentredString(style.x, style.y, str(value))
+            drawn = True
+    return drawn
+
+
+def _render_certificate(student_data: Dict, output_path: str, config: Dict, layout: _OverlayLayout) -> str:
+    """Draw one certificate from an already loaded config and its layout; custom fonts must be registered."""
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4
+    # Draw the overlay in memory; it is only handed to pdfrw, never needed on disk. pdfrw copies
+    # its streams verbatim into the emailed file, so compression is pinned on whatever rl_config says
+    overlay_buffer = io.BytesIO()
+    c = canvas.Canvas(overlay_buffer, pagesize=A4, pageCompression=1)
+    drawn = _draw_overlay(c, student_data, layout)
+    template_path = config.get("template_path", "backend/template.pdf")
+    template_mtime = _template_mtime(template_path)
+    if not drawn and template_mtime is not None:
+        # Blank overlay (ReportLab would save a page-less PDF): the template alone is the certificate
+        _write_atomic(output_path, _read_template_bytes(template_path, template_mtime))
+        logger.debug("Nothing to overlay for %s, copied template as-is", student_data['name'])
+        return output_path
+    c.save()
+    # Certificate bytes: the overlay alone unless it can be merged with the template
+    certificate_bytes = overlay_buffer.getvalue()
+    # Try to merge with template if available
+    if template_mtime is not None:
+        try:
+            template_pdf = _parse_template(template_path, template_mtime)
+            overlay_pdf = PdfReader(fdata=certificate_bytes)
+            if template_pdf.pages and overlay_pdf.pages:
+                certificate_bytes = _merge_onto_template(template_pdf, overlay_pdf.pages[0])
+        except Exception as merge_err:
+            logger.warning("Template merge failed: %s, using overlay only", merge_err)
+    _write_atomic(output_path, certificate_bytes)
+    logger.debug("Config-based certificate generated for %s", student_data['name'])
+    return output_path
+
+
+def _render_certificates(batch: List, config: Dict, layout: _OverlayLayout) -> List[Optional[str]]:
+    """Render a batch of (index, student, output_path) jobs, with None for each certificate that failed.
+
+    The overlays are drawn as consecutive pages of one canvas and parsed with a single
+    PdfReader, rather than a canvas, save and parse per certificate; each page is then
+    merged with the template and written to its own file. Custom fonts must be registered.
+    """
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4
+    overlay_buffer = io.BytesIO()
+    c = canvas.Canvas(overlay_buffer, pagesize=A4, pageCompression=1)
+    drawn_pages = []
+    for _, student, _ in batch:
+        drawn_pages.append(_draw_overlay(c, student, layout))
+        c.showPage()
+    c.save()
+    overlay_pages = PdfReader(fdata=overlay_buffer.getvalue()).pages
+    
+    template_path = config.get("template_path", "backend/template.pdf")
+    template_mtime = _template_mtime(template_path)
+    template_pdf = None
+    if template_mtime is not None:
+        try:
+            template_pdf = _parse_template(template_path, template_mtime)
+        except Exception as e:
+            logger.warning("Template read failed: %s, using overlays only", e)
+    
+    paths = []
+    for (index, student, output_path), overlay_page, drawn in zip(batch, overlay_pages, drawn_pages):
+        try:
+            certificate_bytes = None
+            if not drawn and template_mtime is not None:
+                # Blank overlay: the template alone is the certificate
+                certificate_bytes = _read_template_bytes(template_path, template_mtime)
+            elif template_pdf is not None and template_pdf.pages:
                 try:
-                    template_pdf = PdfReader(template_path)
-                    overlay_pdf = PdfReader(temp_pdf_path)
-                    if (hasattr(template_pdf, "pages") and isinstance(template_pdf.pages, list) and template_pdf.pages and
-                        hasattr(overlay_pdf, "pages") and isinstance(overlay_pdf.pages, list) and overlay_pdf.pages):
-                        for page, overlay_page in zip(template_pdf.pages, overlay_pdf.pages):
-                            merger = PageMerge(page)
-                            merger.add(overlay_page).render()
-                        PdfWriter(output_path, trailer=template_pdf).write()
-                        os.remove(temp_pdf_path)
-                    else:
-                        os.rename(temp_pdf_path, output_path)
+                    certificate_bytes = _merge_onto_template(template_pdf, overlay_page)
                 except Exception as merge_err:
-                    logger.warning(f"Template merge failed: {merge_err}, using overlay only")
-                    os.rename(temp_pdf_path, output_path)
-            else:
-                os.rename(temp_pdf_path, output_path)
-            logger.info(f"Config-based certificate generated for {student_data['name']}")
-            return output_path
+                    logger.warning("Template merge failed: %s, using overlay only", merge_err)
+            if certificate_bytes is None:
+                certificate_bytes = _page_bytes(overlay_page)
+            _write_atomic(output_path, certificate_bytes)
+            logger.debug("Config-based certificate generated for %s", student['name'])
+            paths.append(output_path)
         except Exception as e:
-            logger.error(f"Error generating config-based certificate for {student_data['name']}: {e}")
-            raise
+            logger.error("Failed to generate config-based certificate for student %d: %s", index + 1, e)
+            paths.append(None)
+    return paths
+
+
+def _merge_onto_template(template_pdf: PdfReader, overlay_page) -> bytes:
+    """Serialize the template with overlay_page drawn over its first page; later pages are copied as-is."""
+    merged_buffer = io.BytesIO()
+    writer = PdfWriter(merged_buffer)
+    for page_index, page in enumerate(template_pdf.pages):
+        if page_index == 0 and overlay_page.Contents:
+            # Build a new page; the cached template pages must stay untouched
+            page = PageMerge().add(page).add(overlay_page).render()
+        writer.addpage(page)
+    writer.write()
+    return merged_buffer.getvalue()
+
+
+def _page_bytes(page) -> bytes:
+    """Serialize a single pdfrw page as a PDF of its own."""
+    page_buffer = io.BytesIO()
+    writer = PdfWriter(page_buffer)
+    writer.addpage(page)
+    writer.write()
+    return page_buffer.getvalue()
+
+
+def _batched(iterable: Iterable, size: int) -> Iterator[List]:
+    """Split iterable into lists of up to size items (itertools.batched, which needs Python 3.12)."""
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def _map_bounded(executor: ProcessPoolExecutor, jobs: Iterable, window: int) -> Iterator[Tuple[Tuple, List[Optional[str]]]]:
+    """Like executor.map(_generate_certificate_batch, jobs), but keeps at most window jobs in flight.
+
+    executor.map submits every job up front, draining a streaming roster into memory;
+    here the oldest future is awaited before each new submit, which also keeps input order.
+    Yields (job, result) pairs.
+    """
+    pending = collections.deque()
+    for job in jobs:
+        if len(pending) >= window:
+            done_job, future = pending.popleft()
+            yield done_job, future.result()
+        pending.append((job, executor.submit(_generate_certificate_batch, job)))
+    while pending:
+        done_job, future = pending.popleft()
+        yield done_job, future.result()
+
+
+def merge_certificate_pdfs(paths: List[str], output_path: str) -> str:
+    """Concatenate already generated certificate PDFs into one file at output_path.
+
+    pdftk copies pages without rebuilding the object graph, which is much faster for large
+    batches, so it is used when installed; pdfrw is the fallback. Each call writes its own
+    temp file and swaps it in, so concurrent merges to the same output never interleave.
+    """
+    if not paths:
+        raise ValueError("No certificates to combine")
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(output_path) or ".", suffix=".pdf")
+    os.close(fd)
+    try:
+        pdftk = shutil.which("pdftk")
+        if pdftk:
+            try:
+                subprocess.run([pdftk, *paths, "cat", "output", temp_path], check=True, capture_output=True)
+                os.replace(temp_path, output_path)
+                return output_path
+            except (OSError, subprocess.CalledProcessError) as e:
+                logger.warning("pdftk failed: %s, combining with pdfrw", e)
+        writer = PdfWriter(temp_path)
+        for path in paths:
+            writer.addpages(PdfReader(path).pages)
+        writer.write()
+        os.replace(temp_path, output_path)
+        return output_path
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _collect_paths(results: Iterable[Tuple[Tuple, List[Optional[str]]]],
+                   progress: Optional[Callable[[int], None]] = None) -> List[str]:
+    """Flatten per-batch results into the paths that were written, reporting progress per batch.
+
+    Each written certificate is also recorded under its render key for later batches and runs.
+    """
+    paths = []
+    for (_, _, batch), batch_paths in results:
+        for (_, _, _, key, _), path in zip(batch, batch_paths):
+            if path:
+                paths.append(path)
+                _remember_certificate(key, path)
+        if progress:
+            progress(len(paths))
+    return paths
+
+
+def _generate_certificate_batch(job) -> List[Optional[str]]:
+    """Process pool worker: produce a batch of certificates, with None for each one that failed.
+
+    Batch entries are (index, student, output_path, render_key, source) tuples. An entry with
+    a source (an earlier certificate with the same render key) is linked or copied from it, as
+    is one repeating a render key seen earlier in the batch; only the rest are rendered.
+    """
+    config, layout, batch = job
+    paths: List[Optional[str]] = [None] * len(batch)
+    to_render, to_copy, first_with_key = [], [], {}
+    for position, (index, student, output_path, key, source) in enumerate(batch):
+        if source is None and key not in first_with_key:
+            first_with_key[key] = position
+            to_render.append(position)
+        else:
+            to_copy.append(position)
+    if to_render:
+        rendered = _render_batch([batch[position][:3] for position in to_render], config, layout)
+        for position, path in zip(to_render, rendered):
+            paths[position] = path
+    for position in to_copy:
+        index, student, output_path, key, source = batch[position]
+        if source is None:
+            source = paths[first_with_key[key]]
+            if source is None:
+                continue  # The identical certificate failed to render, so this one would too
+        try:
+            paths[position] = _copy_certificate(source, output_path)
+        except OSError as e:
+            logger.error("Failed to generate config-based certificate for student %d: %s", index + 1, e)
+    return paths
+
+
+def _render_batch(batch: List, config: Dict, layout: _OverlayLayout) -> List[Optional[str]]:
+    """Render (index, student, output_path) jobs together, falling back to one at a time."""
+    _register_custom_fonts(config)
+    try:
+        return _render_certificates(batch, config, layout)
+    except Exception as e:
+        # The shared overlay could not be built; go one at a time so only bad records are lost
+        logger.warning("Batch render failed: %s, rendering certificates one at a time", e)
+    paths = []
+    for index, student, output_path in batch:
+        try:
+            paths.append(_render_certificate(student, output_path, config, layout))
+        except Exception as e:
+            logger.error("Failed to generate config-based certificate for student %d: %s", index + 1, e)
+            paths.append(None)
+    return paths
+
+
+def _copy_certificate(source: str, output_path: str) -> str:
+    """Put an existing certificate at output_path: a hard link where possible, else a copy."""
+    if os.path.exists(output_path) and os.path.samefile(source, output_path):
+        # Already in place (a retry of the same task); renaming a link over its own inode is a no-op
+        return output_path
+    temp_path = output_path + ".tmp"
+    if os.path.lexists(temp_path):
+        os.remove(temp_path)  # Left behind by an interrupted run
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        # Other filesystem, or links unsupported
+        shutil.copyfile(source, temp_path)
+    os.replace(temp_path, output_path)
+    return output_path
@@ -4,5 +4,21 @@ Configuration for backend settings.
 import os
 
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "../uploads")))
+# Point CERT_OUT_DIR at a tmpfs (e.g. /dev/shm/auto-certy) to keep generated PDFs in RAM
+CERT_OUTPUT_DIR = os.path.abspath(os.getenv("CERT_OUT_DIR", os.path.join(os.path.dirname(__file__), "../generated_certificates")))
+# Uploads larger than this are rejected with 413 before they are copied
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024
+# Processes in the shared certificate rendering pool (unset or 0 = one per CPU)
+CERT_RENDER_WORKERS = int(os.getenv("CERT_RENDER_WORKERS", "0")) or None
+# Tasks processed at once by the API; further /process-certificates calls wait their turn
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "4"))
+# Parallel SMTP connections used by EmailSender.send_bulk_emails (mail providers cap concurrent sessions)
+EMAIL_SEND_WORKERS = int(os.getenv("EMAIL_SEND_WORKERS", "4"))
+# Task statuses are mirrored here so /status keeps working after a restart
+STATUS_CACHE_PATH = os.getenv("STATUS_CACHE_PATH", os.path.join(UPLOAD_DIR, ".status_cache.json"))
+# With REDIS_URL set, statuses live in Redis instead, shared by every uvicorn worker and kept this many seconds
+REDIS_URL = os.getenv("REDIS_URL")
+STATUS_TTL_SECONDS = int(os.getenv("STATUS_TTL_SECONDS", str(7 * 24 * 3600)))
 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+os.makedirs(CERT_OUTPUT_DIR, exist_ok=True)
@@ -1,15 +1,25 @@
 import streamlit as st
+import io
 import json
 import os
+from typing import Optional
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from pdfrw import PdfReader, PdfWriter, PageMerge
 from PIL import Image
-from pdf2image import convert_from_path
-import tempfile
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 
+try:
+    # pypdfium2 rasterizes in-process; pdf2image forks poppler's pdftoppm for every render
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+    from pdf2image import convert_from_bytes
+
+# pdf2image's default resolution, kept so the preview looks the same with either rasterizer
+PREVIEW_DPI = 200
+
 CONFIG_PATH = "certificate_config.json"
 
 # Hi! I'm loading the config file here. If it doesn't exist, I'll use a default config for 
@@ -20,11 +30,21 @@ SAMPLE_DATA = {
     "year_of_study": "2025"
 }
 
-# Let's load config if it exists, or use a default one if it doesn't.
-if os.path.exists(CONFIG_PATH):
+
+@st.cache_data(show_spinner=False)
+def load_config(mtime_ns: int) -> dict:
+    """Parse CONFIG_PATH. Keyed on its mtime, so reruns skip the read until the file changes.
+
+    cache_data hands every caller a fresh copy, so the editor below can modify it freely.
+    """
     with open(CONFIG_PATH, "r") as f:
-        config = json.load(f)
-else:
+        return json.load(f)
+
+
+# Let's load config if it exists, or use a default one if it doesn't.
+try:
+    config = load_config(os.stat(CONFIG_PATH).st_mtime_ns)
+except FileNotFoundError:
     config = {
         "fields": {
             "name": {"x": 300, "y": 450, "font": "Helvetica-Bold", "size": 18, "color": "#000000"},
@@ -52,7 +72,9 @@ CUSTOM_FONTS = [
     ("FrunchySage", None)
 ]
 
-with col1:
+# The widgets live in a form, so dragging a slider doesn't rerun the script (and rebuild the
+# preview) until Preview or Save is pressed.
+with col1, st.form("config_form"):
     st.write("## Edit Certificate La")
     config["template_path"] = st.text_input("Template PDF Path", value=config.get("template_path", "template.pdf"))
     st.subheader("Title Settings")
@@ -79,106 +101,208 @@ with col1:
         cfg["size"] = st.number_input(f"{field} Font Size", value=cfg.get("size", 14), key=f"{field}_size")
         cfg["color"] = st.color_picker(f"{field} Color", value=cfg.get("color", "#000000"), key=f"{field}_color")
         config["fields"][field] = cfg
-    if st.button("Save Config"):
-        with open(CONFIG_PATH, "w") as f:
+    preview_col, save_col = st.columns(2)
+    with preview_col:
+        st.form_submit_button("Preview")
+    with save_col:
+        save_clicked = st.form_submit_button("Save Config")
+    if save_clicked:
+        # Write a sibling file and swap it in, so a crash mid-save can't leave a truncated config
+        temp_path = CONFIG_PATH + ".tmp"
+        with open(temp_path, "w") as f:
             json.dump(config, f, indent=2)
+        os.replace(temp_path, CONFIG_PATH)
+        # The new mtime is a new cache key anyway; drop the stale parses
+        load_config.clear()
         st.success("I've saved config!")
-    st.write("Edit the config and see the preview on the right.")
+    st.write("Edit the config, press Preview and see the preview on the right.")
 
 # Inject custom CSS for selected fonts
 font_css = "\n".join([css for name, css in CUSTOM_FONTS if css and (config["title"]["font"] == name or any(f["font"] == name for f in config["fields"].values()))])
 if font_css:
     st.markdown(f"<style>{font_css}</style>", unsafe_allow_html=True)
 
+
+@st.cache_resource(show_spinner=False)
+def register_font(name: str, font_file: str, mtime_ns: int) -> str:
+    """Register a TTF with ReportLab once per server process (and again only if the file changes).
+
+    Parsing a TTF is slow and the registry outlives every rerun, so repeating it is pure waste.
+    """
+    pdfmetrics.registerFont(TTFont(name, font_file))
+    return name
+
+
+def register_preview_fonts(custom_fonts: list) -> list:
+    """Register the config's custom fonts (and FrunchySage); returns (level, message) pairs to show the user."""
+    messages = []
+    for font in custom_fonts:
+        font_file = os.path.join(os.path.dirname(__file__), font["file"])
+        try:
+            register_font(font["name"], font_file, os.stat(font_file).st_mtime_ns)
+            messages.append(("info", f"Successfully registered font: {font['name']}"))
+        except FileNotFoundError:
+            messages.append(("error", f"Font file not found: {font_file}"))
+        except Exception as e:
+            messages.append(("error", f"Could not register font {font['name']}: {e}"))
+    
+    # Also register FrunchySage if it's being used but not in config
+    frunchy_font_path = os.path.join(os.path.dirname(__file__), "FrunchySage.ttf")
+    try:
+        register_font("FrunchySage", frunchy_font_path, os.stat(frunchy_font_path).st_mtime_ns)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        messages.append(("warning", f"Could not register FrunchySage font: {e}"))
+    return messages
+
+
+def draw_preview_overlay(config, sample_data) -> bytes:
+    """Draw the title and sample fields on a blank A4 page and return its PDF bytes; fonts must be registered."""
+    overlay_buffer = io.BytesIO()
+    c = canvas.Canvas(overlay_buffer, pagesize=A4)
+    # Here, I'm drawing the title and each field on the certificate preview using current settings.
+    # I'll draw the title for here.
+    title_cfg = config.get("title", {})
+    try:
+        c.setFont(title_cfg.get("font", "Helvetica-Bold"), title_cfg.get("size", 24))
+    except:
+        c.setFont("Helvetica-Bold", title_cfg.get("size", 24))
+    c.setFillColor(title_cfg.get("color", "#000000"))
+    c.drawCentredString(title_cfg.get("x", 300), title_cfg.get("y", 500), "CERTIFICATE OF COMPLETION")
+    # Now I'll draw each field using settings.
+    for field, cfg in config.get("fields", {}).items():
+        value = sample_data.get(field, "")
+        try:
+            c.setFont(cfg.get("font", "Helvetica"), cfg.get("size", 14))
+        except:
+            c.setFont("Helvetica", cfg.get("size", 14))
+        c.setFillColor(cfg.get("color", "#000000"))
+        c.drawCentredString(cfg.get("x", 300), cfg.get("y", 400), value)
+    c.save()
+    return overlay_buffer.getvalue()
+
+
+def generate_preview_pdf(config, sample_data) -> bytes:
+    """Draw the sample data over the template and return the preview PDF bytes; fonts must be registered."""
+    template_path = config.get("template_path", "template.pdf")
+    overlay_bytes = draw_preview_overlay(config, sample_data)
+    # Let's try to merge overlay with the template PDF.
+    try:
+        template_pdf = PdfReader(template_path)
+        overlay_pdf = PdfReader(fdata=overlay_bytes)
+        # I check that both PDFs have valid pages before merging.
+        if (
+            hasattr(template_pdf, "pages") and isinstance(template_pdf.pages, list) and template_pdf.pages and
+            hasattr(overlay_pdf, "pages") and isinstance(overlay_pdf.pages, list) and overlay_pdf.pages
+        ):
+            # Only the first page is previewed, so only it is merged and written; the rest of
+            # the template (trailer=template_pdf) would just be serialized and thrown away.
+            page, overlay_page = template_pdf.pages[0], overlay_pdf.pages[0]
+            if overlay_page.Contents:
+                page = PageMerge().add(page).add(overlay_page).render()
+            merged_buffer = io.BytesIO()
+            writer = PdfWriter(merged_buffer)
+            writer.addpage(page)
+            writer.write()
+            return merged_buffer.getvalue()
+    except Exception:
+        pass
+    # If template is missing or invalid, I'll just use the overlay.
+    return overlay_bytes
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def template_raster(template_path: str, mtime_ns: int, max_width: int):
+    """Rasterize the template's first page at preview size, once per template version (pdfium only).
+
+    Returns the RGB image and the render scale; copy the image before drawing on it.
+    """
+    pdf = pdfium.PdfDocument(template_path)
+    try:
+        page = pdf[0]
+        scale = min(PREVIEW_DPI / 72, max_width / page.get_width())
+        return page.render(scale=scale).to_pil().convert("RGB"), scale
+    finally:
+        pdf.close()
+
+
+def composite_preview(config, sample_data, template_mtime_ns: int, max_width: int) -> Image.Image:
+    """Paint the rendered overlay onto the cached template raster (pdfium only).
+
+    Looks the same as rasterizing the merged PDF, but an edit only renders the text layer:
+    no template parse, pdfrw merge or full-page render.
+    """
+    background, scale = template_raster(config.get("template_path", "template.pdf"), template_mtime_ns, max_width)
+    pdf = pdfium.PdfDocument(draw_preview_overlay(config, sample_data))
+    try:
+        overlay = pdf[0].render(scale=scale, fill_color=(0, 0, 0, 0)).to_pil()
+    finally:
+        pdf.close()
+    img = background.copy()
+    # PageMerge anchors the overlay at the template's bottom-left corner
+    img.paste(overlay, (0, img.height - overlay.height), overlay)
+    return img
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def render_preview_png(config_json: str, sample_json: str, template_mtime_ns: Optional[int], max_width: int = 900) -> bytes:
+    """Render the first page of the preview certificate as PNG bytes, at most max_width wide.
+
+    Keyed on the config as canonical JSON, so reruns with unchanged settings (and
+    switching back to an earlier layout) reuse the image instead of rebuilding it.
+    template_mtime_ns is only part of the key: replacing the template file renders afresh.
+    """
+    config = json.loads(config_json)
+    sample_data = json.loads(sample_json)
+    if pdfium is not None and template_mtime_ns is not None:
+        try:
+            img = composite_preview(config, sample_data, template_mtime_ns, max_width)
+            return _png_bytes(img)
+        except Exception:
+            pass  # Unreadable template: the merge below falls back to the overlay alone
+    pdf_bytes = generate_preview_pdf(config, sample_data)
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(pdf_bytes)
+        try:
+            page = pdf[0]
+            # Render straight at display size (never above PREVIEW_DPI) so no resample is needed
+            scale = min(PREVIEW_DPI / 72, max_width / page.get_width())
+            img = page.render(scale=scale).to_pil()
+        finally:
+            pdf.close()
+    else:
+        # pdftocairo scales to the display width itself (size overrides dpi), so there is no
+        # full-resolution render to downsample afterwards
+        img = convert_from_bytes(pdf_bytes, first_page=1, last_page=1, size=(max_width, None),
+                                 use_pdftocairo=True)[0]
+    return _png_bytes(img)
+
+
+def _png_bytes(img: Image.Image) -> bytes:
+    # Fast zlib level: on a photo-heavy template the default level costs more than the render itself
+    png_buffer = io.BytesIO()
+    img.save(png_buffer, format="PNG", compress_level=1)
+    return png_buffer.getvalue()
+
+
 # I'm generating a real-time preview of certificate in the sidebar so can see changes instantly.
 with st.sidebar:
     st.write("## Certificate Real-Time Preview")
-    def generate_preview_pdf(config, sample_data, output_path):
+    for level, message in register_preview_fonts(config.get("custom_fonts", [])):
+        getattr(st, level)(message)
+    # I'll render the preview (cached per layout) and show it as an image for 
+    try:
+        max_width = 900
         try:
-            # Register custom fonts if present in config
-            custom_fonts = config.get("custom_fonts", [])
-            for font in custom_fonts:
-                try:
-                    font_file = os.path.join(os.path.dirname(__file__), font["file"])
-                    if os.path.exists(font_file):
-                        pdfmetrics.registerFont(TTFont(font["name"], font_file))
-                        st.info(f"Successfully registered font: {font['name']}")
-                    else:
-                        st.error(f"Font file not found: {font_file}")
-                except Exception as e:
-                    st.error(f"Could not register font {font['name']}: {e}")
-            
-            # Also register FrunchySage if it's being used but not in config
-            frunchy_font_path = os.path.join(os.path.dirname(__file__), "FrunchySage.ttf")
-            if os.path.exists(frunchy_font_path):
-                try:
-                    pdfmetrics.registerFont(TTFont("FrunchySage", frunchy_font_path))
-                except Exception as e:
-                    st.warning(f"Could not register FrunchySage font: {e}")
-            
-            template_path = config.get("template_path", "template.pdf")
-            temp_pdf_path = output_path + ".temp.pdf"
-            c = canvas.Canvas(temp_pdf_path, pagesize=A4)
-            # Here, I'm drawing the title and each field on the certificate preview using current settings.
-            # I'll draw the title for here.
-            title_cfg = config.get("title", {})
-            try:
-                c.setFont(title_cfg.get("font", "Helvetica-Bold"), title_cfg.get("size", 24))
-            except:
-                c.setFont("Helvetica-Bold", title_cfg.get("size", 24))
-            c.setFillColor(title_cfg.get("color", "#000000"))
-            c.drawCentredString(title_cfg.get("x", 300), title_cfg.get("y", 500), "CERTIFICATE OF COMPLETION")
-            # Now I'll draw each field using settings.
-            for field, cfg in config.get("fields", {}).items():
-                value = SAMPLE_DATA.get(field, "")
-                try:
-                    c.setFont(cfg.get("font", "Helvetica"), cfg.get("size", 14))
-                except:
-                    c.setFont("Helvetica", cfg.get("size", 14))
-                c.setFillColor(cfg.get("color", "#000000"))
-                c.drawCentredString(cfg.get("x", 300), cfg.get("y", 400), value)
-            c.save()
-            # Let's try to merge overlay with the template PDF.
-            try:
-                template_pdf = PdfReader(template_path)
-                overlay_pdf = PdfReader(temp_pdf_path)
-                # I check that both PDFs have valid pages before merging.
-                if (
-                    hasattr(template_pdf, "pages") and isinstance(template_pdf.pages, list) and template_pdf.pages and
-                    hasattr(overlay_pdf, "pages") and isinstance(overlay_pdf.pages, list) and overlay_pdf.pages
-                ):
-                    for page, overlay_page in zip(template_pdf.pages, overlay_pdf.pages):
-                        merger = PageMerge(page)
-                        merger.add(overlay_page).render()
-                    PdfWriter(output_path, trailer=template_pdf).write()
-                    os.remove(temp_pdf_path)
-                else:
-                    # If template is invalid, I'll just use the overlay.
-                    os.rename(temp_pdf_path, output_path)
-            except Exception as merge_err:
-                # If template is missing or invalid, I'll just use the overlay.
-                os.rename(temp_pdf_path, output_path)
-            return True
-        except Exception as e:
-            st.error(f"Preview generation failed: {e}")
-            return False
-    # I'll generate a preview PDF and show it as an image for 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        preview_pdf_path = os.path.join(tmpdir, "preview_certificate.pdf")
-        if generate_preview_pdf(config, SAMPLE_DATA, preview_pdf_path):
-            try:
-                images = convert_from_path(preview_pdf_path, first_page=1, last_page=1)
-                if images:
-                    img = images[0]
-                    max_width = 900
-                    if img.width > max_width:
-                        scale = max_width / img.width
-                        new_size = (max_width, int(img.height * scale))
-                        resample_method = getattr(getattr(Image, 'Resampling', Image), 'LANCZOS', getattr(Image, 'BICUBIC', 3))
-                        img = img.resize(new_size, resample=resample_method)
-                    st.image(img, caption="Certificate Preview", width=max_width)
-            except Exception as e:
-                st.error(f"Failed to render PDF preview: {e}")
+            template_mtime_ns = os.stat(config.get("template_path", "template.pdf")).st_mtime_ns
+        except OSError:
+            template_mtime_ns = None
+        preview_png = render_preview_png(json.dumps(config, sort_keys=True), json.dumps(SAMPLE_DATA, sort_keys=True),
+                                         template_mtime_ns, max_width)
+        st.image(preview_png, caption="Certificate Preview", width=max_width)
+    except Exception as e:
+        st.error(f"Failed to render PDF preview: {e}")
 
 # I'm resizing the preview image to fit nicely in the sidebar for 
 # I'm injecting custom CSS to make the sidebar wider so preview is easier to see.
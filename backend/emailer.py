@@ -1,70 +1,175 @@
+import re
 import smtplib
-import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
-from typing import List, Dict
+from typing import List, Dict, Optional
+from backend.config import EMAIL_SEND_WORKERS
 from backend.logger import get_logger
 from backend.models import EmailConfig
 
 # I'm importing the logger so can use it throughout this file.
 logger = get_logger()
 
+# Fields the email body and attachment name are built from
+_REQUIRED_KEYS = frozenset(('name', 'email', 'branch', 'year_of_study'))
+# Cheap shape check for recipient addresses: blank or malformed ones (common in sheets) fail
+# here instead of costing an SMTP round trip; the server still has the final say
+_EMAIL_SHAPE = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
+# send_bulk_emails gives up once more than a third of at least this many sends have failed,
+# rather than hammering a server that is rejecting everything
+ABORT_MIN_ATTEMPTS = 9
+# Temporary (4xx) SMTP replies such as 421/450/451 rate limiting are retried with exponential backoff
+SEND_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 1.0
+
+
+class _SMTPSession:
+    """One authenticated SMTP connection shared by several sends.
+
+    The connection is opened on the first send and reopened once if the server has
+    dropped it (idle timeout or a per-connection message limit). Temporary 4xx replies
+    are retried up to SEND_RETRIES times, backing off exponentially.
+    """
+    def __init__(self, config: EmailConfig):
+        self.config = config
+        self._server = None
+    
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.config.smtp_server, self.config.smtp_port)
+        try:
+            server.starttls()
+            server.login(self.config.sender_email, self.config.sender_password)
+        except Exception:
+            server.close()
+            raise
+        return server
+    
+    def send_message(self, msg) -> None:
+        for attempt in range(SEND_RETRIES):
+            try:
+                return self._send_once(msg)
+            except smtplib.SMTPResponseException as e:
+                if not 400 <= e.smtp_code < 500 or attempt == SEND_RETRIES - 1:
+                    raise
+                logger.warning("SMTP temporary failure %d for %s, retrying", e.smtp_code, msg['To'])
+                if e.smtp_code == 421:
+                    # 421 means the server is closing this connection
+                    self.close()
+                time.sleep(RETRY_BACKOFF_SECONDS * 2 ** attempt)
+    
+    def _send_once(self, msg) -> None:
+        if self._server is None:
+            self._server = self._connect()
+        try:
+            self._server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self._server = None
+            self._server = self._connect()
+            self._server.send_message(msg)
+    
+    def close(self) -> None:
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                self._server.close()
+            self._server = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class RecordRejected(ValueError):
+    """A student record that cannot be mailed (missing fields, bad address, no certificate).
+
+    Raised before anything is sent, so it says nothing about the SMTP server's health.
+    """
+
+
 class EmailSender:
     def __init__(self, config: EmailConfig):
         self.config = config
     
-    def send_email_with_certificate(self, student_data: Dict, certificate_path: str) -> bool:
-        """Send email with certificate attachment to a single student."""
+    def _build_message(self, student_data: Dict, certificate_path: str) -> MIMEMultipart:
+        """Build the email with its certificate attached, or raise RecordRejected."""
+        # Check for required keys before formatting email body
+        if not _REQUIRED_KEYS.issubset(student_data):
+            raise RecordRejected(f"Student record missing keys: {sorted(_REQUIRED_KEYS.difference(student_data))}")
+        if not _EMAIL_SHAPE.fullmatch(student_data['email']):
+            raise RecordRejected(f"Invalid email address for {student_data['name']}: {student_data['email']!r}")
+        
+        # Create message
+        msg = MIMEMultipart()
+        msg['From'] = self.config.sender_email
+        msg['To'] = student_data['email']
+        msg['Subject'] = self.config.subject
+        
+        # Email body
+        body = self.config.body_template.format(
+            name=student_data['name'],
+            branch=student_data['branch'],
+            year=student_data['year_of_study']
+        )
+        msg.attach(MIMEText(body, 'plain'))
+        
+        # Attach certificate; read it in one go and close the file before base64-encoding
         try:
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = self.config.sender_email
-            msg['To'] = student_data['email']
-            msg['Subject'] = self.config.subject
-            
-            # Check for required keys before formatting email body
-            required_keys = ['name', 'email', 'branch', 'year_of_study']
-            missing_keys = [k for k in required_keys if k not in student_data]
-            if missing_keys:
-                logger.error(f"Student record missing keys: {missing_keys}. Data: {student_data}")
-                return False
-            # Email body
-            body = self.config.body_template.format(
-                name=student_data.get('name', 'N/A'),
-                branch=student_data.get('branch', 'N/A'),
-                year=student_data.get('year_of_study', 'N/A')
-            )
-            msg.attach(MIMEText(body, 'plain'))
-            
-            # Attach certificate
-            if os.path.exists(certificate_path):
-                with open(certificate_path, 'rb') as attachment:
-                    part = MIMEApplication(attachment.read(), _subtype='pdf')
-                    part.add_header(
-                        'Content-Disposition',
-                        f'attachment; filename=certificate_{student_data["name"]}.pdf'
-                    )
-                    msg.attach(part)
-            else:
-                logger.error(f"Certificate file not found: {certificate_path}")
-                return False
+            with open(certificate_path, 'rb') as attachment:
+                certificate_bytes = attachment.read()
+        except FileNotFoundError:
+            raise RecordRejected(f"Certificate file not found: {certificate_path}") from None
+        part = MIMEApplication(certificate_bytes, _subtype='pdf')
+        part.add_header(
+            'Content-Disposition',
+            f'attachment; filename=certificate_{student_data["name"]}.pdf'
+        )
+        msg.attach(part)
+        return msg
+    
+    def send_email_with_certificate(self, student_data: Dict, certificate_path: str,
+                                    session: Optional[_SMTPSession] = None) -> bool:
+        """Send email with certificate attachment to a single student.
+
+        Uses session's connection when given, otherwise connects just for this email.
+        """
+        try:
+            msg = self._build_message(student_data, certificate_path)
             
             # Send email
-            with smtplib.SMTP(self.config.smtp_server, self.config.smtp_port) as server:
-                server.starttls()
-                server.login(self.config.sender_email, self.config.sender_password)
-                server.send_message(msg)
+            if session is not None:
+                session.send_message(msg)
+            else:
+                with _SMTPSession(self.config) as single_session:
+                    single_session.send_message(msg)
             
-            logger.info(f"Email sent successfully to {student_data['email']}")
+            logger.info("Email sent successfully to %s", student_data['email'])
             return True
             
+        except RecordRejected as e:
+            logger.error("%s. Data: %s", e, student_data)
+            return False
         except Exception as e:
-            logger.error(f"Error sending email to {student_data['email']}: {e}")
+            logger.error("Error sending email to %s: %s", student_data['email'], e)
             return False
     
-    def send_bulk_emails(self, students: List[Dict], certificate_paths: List[str]) -> Dict:
-        """Send emails to all students with their respective certificates."""
+    def send_bulk_emails(self, students: List[Dict], certificate_paths: List[str],
+                         max_workers: int = EMAIL_SEND_WORKERS) -> Dict:
+        """Send emails to all students with their respective certificates.
+
+        Sending is network-bound, so up to max_workers threads send in parallel. Each
+        thread keeps its own SMTP session, so the TCP, TLS and AUTH handshakes happen once
+        per thread rather than once per student. Results keep the input order. If more
+        than a third of the attempts fail (after ABORT_MIN_ATTEMPTS), the remaining
+        students are not tried and are reported as failed. Records rejected before
+        sending (RecordRejected) are reported as failed but are not attempts.
+        """
         results = {
             'successful': [],
             'failed': [],
@@ -72,34 +177,65 @@ class EmailSender:
             'success_count': 0,
             'failure_count': 0
         }
+        jobs = list(zip(students, certificate_paths))
+        thread_state = threading.local()
+        sessions = []
+        sessions_lock = threading.Lock()
+        attempts = failures = 0
+        aborted = threading.Event()
         
-        for i, (student, cert_path) in enumerate(zip(students, certificate_paths)):
+        def send_one(job):
+            nonlocal attempts, failures
+            if aborted.is_set():
+                return False, "Not sent: bulk sending aborted after too many failures"
+            student, cert_path = job
+            try:
+                msg = self._build_message(student, cert_path)
+            except RecordRejected as e:
+                # Bad rows say nothing about the server, so they don't count towards the abort
+                logger.error("%s. Data: %s", e, student)
+                return False, e
+            session = getattr(thread_state, 'session', None)
+            if session is None:
+                session = thread_state.session = _SMTPSession(self.config)
+                with sessions_lock:
+                    sessions.append(session)
             try:
-                success = self.send_email_with_certificate(student, cert_path)
-                
-                if success:
-                    results['successful'].append({
-                        'name': student['name'],
-                        'email': student['email']
-                    })
-                    results['success_count'] += 1
-                else:
-                    results['failed'].append({
-                        'name': student['name'],
-                        'email': student['email'],
-                        'error': 'Email sending failed'
-                    })
-                    results['failure_count'] += 1
-                    
+                session.send_message(msg)
+                logger.info("Email sent successfully to %s", student['email'])
+                success, error = True, None
             except Exception as e:
-                results['failed'].append({
-                    'name': student['name'],
-                    'email': student['email'],
-                    'error': str(e)
-                })
-                results['failure_count'] += 1
+                logger.error("Error sending email to %s: %s", student['email'], e)
+                success, error = False, e
+            with sessions_lock:
+                attempts += 1
+                failures += not success
+                if attempts >= ABORT_MIN_ATTEMPTS and failures * 3 > attempts and not aborted.is_set():
+                    logger.error("Aborting bulk email: %d of %d sends failed", failures, attempts)
+                    aborted.set()
+            return success, error
+        
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as executor:
+                for (student, cert_path), (success, error) in zip(jobs, executor.map(send_one, jobs)):
+                    if success:
+                        results['successful'].append({
+                            'name': student['name'],
+                            'email': student['email']
+                        })
+                        results['success_count'] += 1
+                    else:
+                        results['failed'].append({
+                            'name': student['name'],
+                            'email': student['email'],
+                            'error': str(error) if error is not None else 'Email sending failed'
+                        })
+                        results['failure_count'] += 1
+        finally:
+            for session in sessions:
+                session.close()
         
-        logger.info(f"Email sending completed. Success: {results['success_count']}, Failed: {results['failure_count']}")
+        logger.info("Email sending completed. Success: %d, Failed: %d", results['success_count'], results['failure_count'])
         return results
     
     def test_email_connection(self) -> bool:
@@ -111,5 +247,5 @@ class EmailSender:
             logger.info("Email connection test successful")
             return True
         except Exception as e:
-            logger.error(f"Email connection test failed: {e}")
+            logger.error("Email connection test failed: %s", e)
             return False
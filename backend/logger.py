@@ -1,7 +1,14 @@
+import atexit
+import functools
 import logging
+import logging.handlers
 import os
+import queue
 import datetime
 
+# Built once per name and process: every backend module calls this at import, and rebuilding
+# would reopen the log files (leaking the old handlers' file descriptors) each time.
+@functools.lru_cache(maxsize=None)
 def get_logger(name="certificate_logger"):
     now = datetime.datetime.now()
     log_folder = f"log/{now.strftime('%d_%m_%Y')}_log"
@@ -14,10 +21,6 @@ def get_logger(name="certificate_logger"):
     logger.setLevel(logging.INFO)
     logger.propagate = False  # Prevent duplicate logs if imported multiple times
 
-    # I'm removing any existing handlers to avoid duplicate logs.
-    if logger.hasHandlers():
-        logger.handlers.clear()
-
     # I'm adding handlers for info, error, and console output so can see logs everywhere need.
     # File handlers
     info_file_handler = logging.FileHandler(info_log_path)
@@ -35,10 +38,16 @@ def get_logger(name="certificate_logger"):
     error_file_handler.setFormatter(formatter)
     console_handler.setFormatter(formatter)
 
-    # Add handlers
-    logger.addHandler(info_file_handler)
-    logger.addHandler(error_file_handler)
-    logger.addHandler(console_handler)
+    # Log calls only enqueue the record; a listener thread does the file and console writes,
+    # so hot paths like bulk email sending never wait on disk I/O
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, info_file_handler, error_file_handler, console_handler, respect_handler_level=True
+    )
+    listener.start()
+    # Drain whatever is still queued when the process exits
+    atexit.register(listener.stop)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
 
     return logger
 
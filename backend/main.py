@@ -1,14 +1,19 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Form
+from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from typing import Optional, Dict
 from datetime import datetime
 import uuid
-from backend.models import ProcessingStatus, EmailConfig
-from backend.certificate import CertificateGenerator
+from backend.models import ProcessingStatus, EmailConfig, TaskStatusResponse
+from backend.certificate import CertificateGenerator, merge_certificate_pdfs, shutdown_process_pool
 from backend.emailer import EmailSender
-from backend.config import UPLOAD_DIR
+from backend.config import UPLOAD_DIR, CERT_OUTPUT_DIR, STATUS_CACHE_PATH, REDIS_URL, STATUS_TTL_SECONDS, MAX_UPLOAD_BYTES, MAX_CONCURRENT_JOBS, CERT_RENDER_WORKERS
+from backend.status_store import AsyncStatusStore, open_status_store
 from backend.utils import validate_excel_file, read_and_save_file, http_error
 import dotenv
 from backend.logger import get_logger
@@ -19,7 +24,26 @@ dotenv.load_dotenv()
 # Whenever you need to log something, just use logger.info or logger.error and I'll handle the rest.
 logger = get_logger()
 
-app = FastAPI(title="Auto-Certy API", description="Automated Certificate Generator and Mailer", version="1.0.0")
+# Threads that run a task's long blocking steps (rendering, SMTP checks, bulk sending); set up
+# by lifespan with one thread per MAX_CONCURRENT_JOBS slot, so running tasks never occupy the
+# default executor that uploads, cleanup and merges need
+job_executor: Optional[ThreadPoolExecutor] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global job_executor
+    # Bounded pool for run_in_executor/to_thread work (file copies, cleanup, merges), so blocking
+    # helpers don't oversubscribe the cores the rendering processes need
+    executor = ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 1) * 2), thread_name_prefix="api-io")
+    asyncio.get_running_loop().set_default_executor(executor)
+    job_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_JOBS, thread_name_prefix="api-job")
+    yield
+    # Stop the certificate rendering workers with the server
+    shutdown_process_pool()
+    executor.shutdown(wait=False)
+    job_executor.shutdown(wait=False)
+
+app = FastAPI(title="Auto-Certy API", description="Automated Certificate Generator and Mailer", version="1.0.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -30,8 +54,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory storage for processing status (use Redis/DB in production)
-processing_status = {}
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    # Refuse oversized bodies from the declared length, before the multipart parser spools them;
+    # an upload carries at most two files (the per-file limit is checked again in read_and_save_file)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > 2 * MAX_UPLOAD_BYTES:
+        return JSONResponse(status_code=413, content={"detail": "Request body too large"})
+    return await call_next(request)
+
+# /status/{task_id}/stream sends at most one update per interval, and a comment when idle this long
+STATUS_STREAM_INTERVAL = 0.5
+STATUS_STREAM_KEEPALIVE = 15.0
+# Statuses after which a task no longer changes
+FINISHED_STATUSES = ("completed", "error")
+
+# Each task renders on the shared process pool and opens its own SMTP sessions, so only a few
+# run at once; the rest wait here instead of all competing for CPU and the mail server
+job_slots = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+# Upper bound for a task's own rendering pool (the jobs form field), so one request can't
+# spawn more processes than the shared pool is allowed
+MAX_RENDER_WORKERS = CERT_RENDER_WORKERS or os.cpu_count() or 1
+
+# Processing status: in Redis when REDIS_URL is set, otherwise in memory mirrored to disk,
+# so tasks survive a restart either way; accessed through awaitable calls that run off the event loop
+processing_status = AsyncStatusStore(open_status_store(STATUS_CACHE_PATH, REDIS_URL, STATUS_TTL_SECONDS))
 
 @app.get("/")
 async def root():
@@ -57,6 +104,7 @@ async def upload_files(
         excel_filename = excel_file.filename or "unknown_file.xlsx"
         excel_path = os.path.join(UPLOAD_DIR, f"{task_id}_{excel_filename}")
         await read_and_save_file(excel_file, excel_path)
+        task_files = [excel_path]
         # Handle template file
         template_filename = None
         if template_file and template_file.filename:
@@ -64,14 +112,16 @@ async def upload_files(
                 raise http_error(400, "Template file must be PDF format.")
             template_path = os.path.join(UPLOAD_DIR, f"{task_id}_{template_file.filename}")
             await read_and_save_file(template_file, template_path)
+            task_files.append(template_path)
             template_filename = template_file.filename
         # Initialize processing status
-        processing_status[task_id] = ProcessingStatus(
+        await processing_status.set(task_id, ProcessingStatus(
             status="uploaded",
             message="Files uploaded successfully",
             processed_count=0,
-            total_count=0
-        )
+            total_count=0,
+            files=task_files
+        ))
         return {
             "task_id": task_id,
             "message": "Files uploaded successfully",
@@ -81,7 +131,7 @@ async def upload_files(
     except HTTPException as he:
         raise he
     except Exception as e:
-        logger.error(f"Error uploading files: {e}")
+        logger.error("Error uploading files: %s", e)
         raise http_error(500, "Internal server error: " + str(e))
 
 @app.post("/process-certificates")
@@ -93,16 +143,17 @@ async def process_certificates(
     email_subject: str = Form("Your Certificate"),
     email_body: str = Form("Dear {name},\n\nPlease find your certificate attached.\n\nBest regards,\nCertificate Team"),
     smtp_server: str = Form("smtp.gmail.com"),
-    smtp_port: int = Form(587)
+    smtp_port: int = Form(587),
+    jobs: int = Form(0, ge=0, le=MAX_RENDER_WORKERS,
+                     description="Worker processes for certificate generation (0 = the shared pool)")
 ):
     """Start certificate generation and email sending process."""
     try:
-        if task_id not in processing_status:
+        if await processing_status.get(task_id) is None:
             raise HTTPException(status_code=404, detail="Task ID not found")
         
         # Update status
-        processing_status[task_id].status = "processing"
-        processing_status[task_id].message = "Starting certificate generation..."
+        await processing_status.update(task_id, status="processing", message="Starting certificate generation...")
         
         # Create email configuration
         email_config = EmailConfig(
@@ -118,7 +169,8 @@ async def process_certificates(
         background_tasks.add_task(
             process_certificates_background,
             task_id,
-            email_config
+            email_config,
+            jobs or None
         )
         
         return {
@@ -128,78 +180,185 @@ async def process_certificates(
         }
         
     except Exception as e:
-        logger.error(f"Error starting certificate processing: {e}")
+        logger.error("Error starting certificate processing: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
-async def process_certificates_background(task_id: str, email_config: EmailConfig):
-    """Background task to process certificates and send emails."""
+async def process_certificates_background(task_id: str, email_config: EmailConfig, jobs: Optional[int] = None):
+    """Background task: process the task once one of the MAX_CONCURRENT_JOBS slots is free."""
+    if job_slots.locked():
+        await processing_status.update(task_id, message="Queued: waiting for running tasks to finish...")
+    async with job_slots:
+        await _process_certificates(task_id, email_config, jobs)
+
+async def _process_certificates(task_id: str, email_config: EmailConfig, jobs: Optional[int] = None):
+    """Generate the task's certificates and send the emails.
+
+    Parsing, rendering and SMTP are all blocking, so each step runs in job_executor to
+    keep the event loop (and the default executor) serving other requests.
+    """
+    loop = asyncio.get_running_loop()
     try:
-        # Find uploaded files
-        excel_files = [f for f in os.listdir(UPLOAD_DIR) if f.startswith(task_id) and f.endswith(('.xlsx', '.xls', '.csv'))]
-        if not excel_files:
-            processing_status[task_id].status = "error"
-            processing_status[task_id].message = "Excel/CSV file not found"
+        # The Excel/CSV upload is always the first file recorded for the task
+        status = await processing_status.get(task_id)
+        task_files = status.files if status is not None else []
+        if not task_files or not os.path.exists(task_files[0]):
+            await processing_status.update(task_id, status="error", message="Excel/CSV file not found")
             return
         
-        excel_path = os.path.join(UPLOAD_DIR, excel_files[0])
+        excel_path = task_files[0]
         
         # Initialize certificate generator
         cert_generator = CertificateGenerator()
         
-        # Parse Excel/CSV file
-        processing_status[task_id].message = "Parsing data file..."
-        students = cert_generator.parse_excel_csv(excel_path)
-        processing_status[task_id].total_count = len(students)
+        # Stream the Excel/CSV rows straight into rendering, keeping each record for the email step.
+        # Repeated rows (same email and name, e.g. from copy-paste) get one certificate and one email.
+        students = []
+        seen = set()
+        duplicates = 0
+        
+        def stream_students():
+            nonlocal duplicates
+            for student in cert_generator.iter_students(excel_path):
+                key = (student['email'].lower(), student['name'])
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                students.append(student)
+                yield student
         
         # Generate certificates using configuration
-        processing_status[task_id].message = "Generating certificates with custom layout..."
-        certificate_paths = cert_generator.generate_all_certificates(students)
+        await processing_status.update(task_id, message="Parsing data file and generating certificates with custom layout...")
+        
+        def report_progress(done):
+            # Rows are parsed as rendering goes, so the total grows with each batch too
+            processing_status.set_progress(task_id, processed_count=done, total_count=len(students))
+        
+        # Each task writes to its own directory, so tasks built from the same roster (same
+        # file names) never share files and cleaning up one can't delete another's certificates
+        certificate_paths = await loop.run_in_executor(
+            job_executor, functools.partial(cert_generator.generate_all_certificates, stream_students(),
+                                    max_workers=jobs, progress=report_progress,
+                                    output_dir=_task_output_dir(task_id))
+        )
+        
+        if duplicates:
+            logger.info("Skipped %d duplicate rows for task %s", duplicates, task_id)
         
         # Update progress
-        processing_status[task_id].processed_count = len(certificate_paths)
-        processing_status[task_id].message = "Certificates generated. Sending emails..."
+        await processing_status.update(
+            task_id,
+            processed_count=len(certificate_paths),
+            total_count=len(students),
+            files=task_files + certificate_paths,
+            certificates=certificate_paths,
+            message="Certificates generated. Sending emails...",
+        )
         
         # Send emails
         email_sender = EmailSender(email_config)
         
         # Test email connection first
-        if not email_sender.test_email_connection():
-            processing_status[task_id].status = "error"
-            processing_status[task_id].message = "Email connection failed. Please check  credentials."
+        if not await loop.run_in_executor(job_executor, email_sender.test_email_connection):
+            await processing_status.update(task_id, status="error", message="Email connection failed. Please check  credentials.")
             return
         
         # Send bulk emails
-        email_results = email_sender.send_bulk_emails(students, certificate_paths)
+        email_results = await loop.run_in_executor(job_executor, email_sender.send_bulk_emails, students, certificate_paths)
         
         # Update final status
-        processing_status[task_id].status = "completed"
-        processing_status[task_id].message = f"Process completed. Sent {email_results['success_count']} emails successfully, {email_results['failure_count']} failed."
-        processing_status[task_id].processed_count = email_results['success_count']
-        
-        # Store detailed results
-        processing_status[task_id].results = email_results
+        # Update final status and store detailed results
+        await processing_status.update(
+            task_id,
+            status="completed",
+            message=f"Process completed. Sent {email_results['success_count']} emails successfully, {email_results['failure_count']} failed.",
+            processed_count=email_results['success_count'],
+            results=email_results,
+        )
         
     except Exception as e:
-        logger.error(f"Error in background processing: {e}")
-        processing_status[task_id].status = "error"
-        processing_status[task_id].message = f"Processing failed: {str(e)}"
+        logger.error("Error in background processing: %s", e)
+        await processing_status.update(task_id, status="error", message=f"Processing failed: {str(e)}")
 
 @app.get("/status/{task_id}")
-async def get_status(task_id: str):
+async def get_status(task_id: str) -> TaskStatusResponse:
     """Get processing status for a task."""
-    if task_id not in processing_status:
+    status = await processing_status.get(task_id)
+    if status is None:
         raise HTTPException(status_code=404, detail="Task ID not found")
     
-    status = processing_status[task_id]
-    return {
-        "task_id": task_id,
-        "status": status.status,
-        "message": status.message,
-        "processed_count": status.processed_count,
-        "total_count": status.total_count,
-        "timestamp": status.timestamp,
-        "results": getattr(status, 'results', None)
-    }
+    return _status_response(task_id, status)
+
+@app.get("/status/{task_id}/stream")
+async def stream_status(task_id: str):
+    """Push the task's status as Server-Sent Events whenever it changes, until it completes or fails.
+
+    One open connection replaces the client re-polling /status. The status is re-read only when
+    the store reports a change to the task (or after STATUS_STREAM_KEEPALIVE seconds without one).
+    """
+    if await processing_status.get(task_id) is None:
+        raise HTTPException(status_code=404, detail="Task ID not found")
+    
+    async def events():
+        last_payload = None
+        with processing_status.watch(task_id) as changed:
+            while True:
+                # Cleared before the read, so a change made while reading still wakes us
+                changed.clear()
+                status = await processing_status.get(task_id)
+                if status is None:
+                    return  # Cleaned up while streaming
+                payload = _status_response(task_id, status).model_dump_json()
+                if payload != last_payload:
+                    last_payload = payload
+                    yield f"data: {payload}\n\n"
+                if status.status in FINISHED_STATUSES:
+                    return
+                # Progress reports arrive per rendered batch; coalesce them to one event per interval
+                await asyncio.sleep(STATUS_STREAM_INTERVAL)
+                try:
+                    await asyncio.wait_for(changed.wait(), STATUS_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Keeps proxies and the client's read timeout from closing a quiet stream
+                    yield ": keepalive\n\n"
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def _status_response(task_id: str, status: ProcessingStatus) -> TaskStatusResponse:
+    return TaskStatusResponse(
+        task_id=task_id,
+        status=status.status,
+        message=status.message,
+        processed_count=status.processed_count,
+        total_count=status.total_count,
+        timestamp=status.timestamp,
+        results=status.results
+    )
+
+@app.get("/certificates/{task_id}/combined")
+async def download_combined_certificates(task_id: str):
+    """Download every certificate generated for a task as a single PDF."""
+    status = await processing_status.get(task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Task ID not found")
+
+    # Only the per-student certificates: files also holds the uploads and the combined PDF itself
+    certificate_paths = status.certificates
+    if not certificate_paths:
+        raise HTTPException(status_code=409, detail="No certificates have been generated for this task yet")
+    
+    combined_path = os.path.join(CERT_OUTPUT_DIR, f"{task_id}_certificates.pdf")
+    try:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, merge_certificate_pdfs, certificate_paths, combined_path)
+    except Exception as e:
+        logger.error("Error combining certificates for task %s: %s", task_id, e)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if combined_path not in status.files:
+        # Recorded with the task so cleanup removes it too
+        await processing_status.update(task_id, files=status.files + [combined_path])
+    return FileResponse(combined_path, media_type="application/pdf", filename="certificates.pdf")
 
 @app.get("/tasks")
 async def list_tasks():
@@ -212,7 +371,7 @@ async def list_tasks():
                 "message": status.message,
                 "timestamp": status.timestamp
             }
-            for task_id, status in processing_status.items()
+            for task_id, status in await processing_status.items()
         ]
     }
 
@@ -221,27 +380,36 @@ async def cleanup_task(task_id: str):
     """Clean up files and status for a completed task."""
     try:
         # Remove from processing status
-        if task_id in processing_status:
-            del processing_status[task_id]
-        
-        # Clean up uploaded files
-        for filename in os.listdir(UPLOAD_DIR):
-            if filename.startswith(task_id):
-                os.remove(os.path.join(UPLOAD_DIR, filename))
+        status = await processing_status.pop(task_id)
+        task_files = status.files if status is not None else []
         
-        # Clean up generated certificates
-        cert_dir = "../generated_certificates"
-        if os.path.exists(cert_dir):
-            for filename in os.listdir(cert_dir):
-                if task_id in filename:
-                    os.remove(os.path.join(cert_dir, filename))
+        # Clean up the uploaded files and generated certificates recorded for the task; a big
+        # roster means thousands of unlinks, so they run in a worker thread, off the event loop
+        await asyncio.to_thread(_remove_files, task_files, _task_output_dir(task_id) if task_files else None)
         
         return {"message": "Task cleaned up successfully"}
         
     except Exception as e:
-        logger.error(f"Error cleaning up task: {e}")
+        logger.error("Error cleaning up task: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+def _task_output_dir(task_id: str) -> str:
+    """Directory holding the certificates generated for a task."""
+    return os.path.join(CERT_OUTPUT_DIR, task_id)
+
+def _remove_files(paths, directory=None):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    if directory:
+        # Only removed once empty: the task's files were all deleted above
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -15,6 +15,18 @@ class ProcessingStatus(BaseModel):
     total_count: int = 0
     timestamp: datetime = datetime.now()
     results: Optional[dict] = None  # Added to store summary/results
+    files: List[str] = []  # Uploaded and generated files owned by this task, Excel/CSV first
+    certificates: List[str] = []  # The per-student certificate PDFs, a subset of files
+
+class TaskStatusResponse(BaseModel):
+    """Body of GET /status/{task_id}; declared so FastAPI serializes it straight to JSON with pydantic-core."""
+    task_id: str
+    status: str
+    message: str
+    processed_count: int = 0
+    total_count: int = 0
+    timestamp: datetime
+    results: Optional[dict] = None
 
 class EmailConfig(BaseModel):
     smtp_server: str = "smtp.gmail.com"
@@ -0,0 +1,302 @@
+"""
+Task status storage that survives API restarts.
+"""
+import asyncio
+import contextlib
+import functools
+import json
+import os
+import tempfile
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from pydantic_core import to_jsonable_python
+
+from backend.models import ProcessingStatus
+from backend.logger import get_logger
+
+try:
+    # Only needed when statuses are shared through Redis (REDIS_URL)
+    import redis
+except ImportError:
+    redis = None
+
+logger = get_logger()
+
+# States that only make sense while the worker that owns them is alive
+_IN_FLIGHT = ("processing",)
+# Sets hash fields (ARGV[3:], name/value pairs), refreshes the TTL (ARGV[1]) and announces the
+# change on the ARGV[2] channel in one round trip, and only if the task still exists, so a late
+# progress report can't resurrect a task that was cleaned up
+_REDIS_UPDATE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('PUBLISH', ARGV[2], KEYS[1])
+return 1
+"""
+
+
+class StatusStore:
+    """Dict-like map of task_id -> ProcessingStatus mirrored to a JSON file.
+
+    Reads are served from the in-memory mirror; the file is only read once on
+    start-up and rewritten atomically (temp file + os.replace) whenever a
+    status is added, updated through ``update`` or removed.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+        self._data: Dict[str, ProcessingStatus] = self._load()
+
+    def _load(self) -> Dict[str, ProcessingStatus]:
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error("Could not read status cache %s: %s", self._path, e)
+            return {}
+        data = {}
+        for task_id, fields in raw.items():
+            try:
+                status = ProcessingStatus.model_validate(fields)
+            except ValueError as e:
+                logger.warning("Skipping unreadable status for task %s: %s", task_id, e)
+                continue
+            if status.status in _IN_FLIGHT:
+                # The background task died with the previous process
+                status.status = "error"
+                status.message = "Processing interrupted by a server restart. Please start it again."
+            data[task_id] = status
+        return data
+
+    def _save(self) -> None:
+        snapshot = {task_id: status.model_dump(mode="json") for task_id, status in self._data.items()}
+        directory = os.path.dirname(self._path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".status-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            logger.error("Could not write status cache %s: %s", self._path, e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._data
+
+    def __getitem__(self, task_id: str) -> ProcessingStatus:
+        return self._data[task_id]
+
+    def __setitem__(self, task_id: str, status: ProcessingStatus) -> None:
+        with self._lock:
+            self._data[task_id] = status
+            self._save()
+
+    def __delitem__(self, task_id: str) -> None:
+        with self._lock:
+            del self._data[task_id]
+            self._save()
+
+    def items(self) -> Iterator[Tuple[str, ProcessingStatus]]:
+        return iter(list(self._data.items()))
+
+    def update(self, task_id: str, **fields) -> None:
+        """Apply a status transition and persist it."""
+        with self._lock:
+            status = self._data[task_id]
+            for name, value in fields.items():
+                setattr(status, name, value)
+            self._save()
+
+    def set_progress(self, task_id: str, **fields) -> None:
+        """Record intermediate counters; they reach the file with the next transition."""
+        with self._lock:
+            status = self._data[task_id]
+            for name, value in fields.items():
+                setattr(status, name, value)
+
+    def subscribe(self, callback: Callable[[str], None]) -> None:
+        """No-op: only this process writes the file, and AsyncStatusStore reports its own changes."""
+
+
+class RedisStatusStore:
+    """StatusStore backed by one Redis hash per task, shared by every API worker process.
+
+    Each ProcessingStatus field is a JSON-encoded hash field, so an update sends only the
+    fields that changed, all in one scripted round trip. Keys expire after ttl seconds, which
+    bounds Redis memory even for tasks that are never cleaned up. Every change is also
+    published on _CHANNEL, so processes streaming a task's status hear about it.
+    ProcessingStatus objects returned here are snapshots: change a task through update or
+    set_progress, not by assigning attributes.
+    """
+
+    _PREFIX = "task:"
+    _CHANNEL = "task-status"
+
+    def __init__(self, url: str, ttl: int):
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._ttl = ttl
+        self._update_script = self._redis.register_script(_REDIS_UPDATE_SCRIPT)
+
+    def _key(self, task_id: str) -> str:
+        return self._PREFIX + task_id
+
+    def _write(self, task_id: str, fields: Dict) -> bool:
+        """Set fields on an existing task; returns False if the task does not exist."""
+        args = [self._ttl, self._CHANNEL]
+        for name, value in fields.items():
+            args += [name, json.dumps(to_jsonable_python(value))]
+        return bool(self._update_script(keys=[self._key(task_id)], args=args))
+
+    def __contains__(self, task_id: str) -> bool:
+        return bool(self._redis.exists(self._key(task_id)))
+
+    def __getitem__(self, task_id: str) -> ProcessingStatus:
+        fields = self._redis.hgetall(self._key(task_id))
+        if not fields:
+            raise KeyError(task_id)
+        return ProcessingStatus.model_validate({name: json.loads(value) for name, value in fields.items()})
+
+    def __setitem__(self, task_id: str, status: ProcessingStatus) -> None:
+        key = self._key(task_id)
+        with self._redis.pipeline() as pipe:
+            # Replace the whole hash so fields from an earlier status don't linger
+            pipe.delete(key)
+            pipe.hset(key, mapping={name: json.dumps(value) for name, value in status.model_dump(mode="json").items()})
+            pipe.expire(key, self._ttl)
+            pipe.publish(self._CHANNEL, key)
+            pipe.execute()
+
+    def __delitem__(self, task_id: str) -> None:
+        key = self._key(task_id)
+        if not self._redis.delete(key):
+            raise KeyError(task_id)
+        self._redis.publish(self._CHANNEL, key)
+
+    def items(self) -> Iterator[Tuple[str, ProcessingStatus]]:
+        # SCAN rather than KEYS, so listing never blocks the server
+        for key in self._redis.scan_iter(match=self._PREFIX + "*"):
+            task_id = key[len(self._PREFIX):]
+            try:
+                yield task_id, self[task_id]
+            except KeyError:
+                continue  # Expired or cleaned up mid-scan
+
+    def update(self, task_id: str, **fields) -> None:
+        """Apply a status transition."""
+        if not self._write(task_id, fields):
+            raise KeyError(task_id)
+
+    def set_progress(self, task_id: str, **fields) -> None:
+        """Record intermediate counters (written straight through, like update)."""
+        self._write(task_id, fields)
+
+    def subscribe(self, callback: Callable[[str], None]) -> None:
+        """Call callback(task_id), from a listener thread, whenever any process changes a task."""
+        def on_message(message):
+            callback(message["data"][len(self._PREFIX):])
+
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self._CHANNEL: on_message})
+        pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+
+class AsyncStatusStore:
+    """Awaitable front for StatusStore or RedisStatusStore, used by the API's coroutines.
+
+    Each call runs in a worker thread, since a Redis round trip (or a status file rewrite)
+    would otherwise stall the event loop. set_progress stays synchronous: it is called from
+    the rendering thread, not the loop. Changes made here, or published by other processes
+    sharing a RedisStatusStore, set the events handed out by watch.
+    """
+
+    def __init__(self, store: Union[StatusStore, RedisStatusStore]):
+        self._store = store
+        self._watchers: Dict[str, Set[asyncio.Event]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get(self, task_id: str) -> Optional[ProcessingStatus]:
+        try:
+            return self._store[task_id]
+        except KeyError:
+            return None
+
+    def _pop(self, task_id: str) -> Optional[ProcessingStatus]:
+        status = self._get(task_id)
+        if status is not None:
+            try:
+                del self._store[task_id]
+            except KeyError:
+                pass  # Removed concurrently
+        return status
+
+    async def get(self, task_id: str) -> Optional[ProcessingStatus]:
+        """The task's status, or None if there is no such task."""
+        return await asyncio.to_thread(self._get, task_id)
+
+    async def set(self, task_id: str, status: ProcessingStatus) -> None:
+        await asyncio.to_thread(self._store.__setitem__, task_id, status)
+        self._notify(task_id)
+
+    async def pop(self, task_id: str) -> Optional[ProcessingStatus]:
+        """Remove the task and return its last status, or None if there was no such task."""
+        status = await asyncio.to_thread(self._pop, task_id)
+        self._notify(task_id)
+        return status
+
+    async def items(self) -> List[Tuple[str, ProcessingStatus]]:
+        return await asyncio.to_thread(lambda: list(self._store.items()))
+
+    async def update(self, task_id: str, **fields) -> None:
+        """Apply a status transition (KeyError if the task does not exist)."""
+        await asyncio.to_thread(functools.partial(self._store.update, task_id, **fields))
+        self._notify(task_id)
+
+    def set_progress(self, task_id: str, **fields) -> None:
+        self._store.set_progress(task_id, **fields)
+        self._notify_threadsafe(task_id)
+
+    @contextlib.contextmanager
+    def watch(self, task_id: str) -> Iterator[asyncio.Event]:
+        """Event that is set whenever the task changes; clear it before each read of the status."""
+        if self._loop is None:
+            self._store.subscribe(self._notify_threadsafe)
+        self._loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        watchers = self._watchers.setdefault(task_id, set())
+        watchers.add(event)
+        try:
+            yield event
+        finally:
+            watchers.discard(event)
+            if not watchers:
+                self._watchers.pop(task_id, None)
+
+    def _notify(self, task_id: str) -> None:
+        for event in self._watchers.get(task_id, ()):
+            event.set()
+
+    def _notify_threadsafe(self, task_id: str) -> None:
+        if self._loop is not None and task_id in self._watchers:
+            try:
+                self._loop.call_soon_threadsafe(self._notify, task_id)
+            except RuntimeError:
+                pass  # The loop that was watching has closed
+
+
+def open_status_store(path: str, redis_url: Optional[str] = None, ttl: int = 7 * 24 * 3600):
+    """Return the Redis-backed store when redis_url is set (and redis-py is installed), else the JSON file store."""
+    if redis_url:
+        if redis is not None:
+            return RedisStatusStore(redis_url, ttl)
+        logger.warning("REDIS_URL is set but the redis package is not installed, keeping task statuses in %s", path)
+    return StatusStore(path)
@@ -1,14 +1,18 @@
 """
 Utility functions for file handling, validation, and error responses.
 """
-import os
+import asyncio
+import shutil
 from fastapi import UploadFile, HTTPException
 from typing import Optional
+from backend.config import MAX_UPLOAD_BYTES
 from backend.logger import get_logger
 
 # I'm importing the logger so can use it throughout this file.
 logger = get_logger()
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
 # File validation
 
 def validate_excel_file(excel_file: UploadFile) -> None:
@@ -17,18 +21,34 @@ def validate_excel_file(excel_file: UploadFile) -> None:
     if not excel_file.filename.endswith((".xlsx", ".xls", ".csv")):
         raise http_error(400, "Excel file must be .xlsx, .xls, or .csv format.")
 
+def validate_upload_size(file: UploadFile) -> None:
+    # size comes from the multipart parser, so this costs nothing and runs before any copy
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise http_error(413, f"Uploaded file {file.filename} is too large (limit {MAX_UPLOAD_BYTES // (1024 * 1024)} MB).")
+
 async def read_and_save_file(file: UploadFile, path: str) -> int:
-    content = await file.read()
-    if not content:
+    validate_upload_size(file)
+    # The whole copy runs as one worker-thread job: large uploads never sit whole in memory
+    # and the event loop never waits on disk I/O (aiofiles would hop threads per chunk)
+    size = await asyncio.to_thread(_copy_upload, file.file, path)
+    if not size:
         raise http_error(400, f"Uploaded file {file.filename} is empty.")
-    with open(path, 'wb') as f:
-        f.write(content)
     # Whenever need to log something, just use logger.info or logger.error and I'll handle the rest.
-    logger.info(f"Saved file: {path} ({len(content)} bytes)")
-    return len(content)
+    logger.info("Saved file: %s (%d bytes)", path, size)
+    return size
+
+def _copy_upload(source, path: str) -> int:
+    """Copy an upload's spooled file to path in UPLOAD_CHUNK_SIZE pieces; returns 0 (writing nothing) if it is empty."""
+    chunk = source.read(UPLOAD_CHUNK_SIZE)
+    if not chunk:
+        return 0
+    with open(path, 'wb') as f:
+        f.write(chunk)
+        shutil.copyfileobj(source, f, UPLOAD_CHUNK_SIZE)
+        return f.tell()
 
 # Error handling
 
 def http_error(status_code: int, detail: str) -> HTTPException:
-    logger.error(f"Upload error: {detail}")
+    logger.error("Upload error: %s", detail)
     return HTTPException(status_code=status_code, detail=detail)
@@ -1,8 +1,12 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
 import time
 import os
+import io
+import json
+import importlib.util
 from typing import Optional
 
 # Page configuration
@@ -16,6 +20,28 @@ st.set_page_config(
 # Backend API URL
 API_BASE_URL = "http://localhost:8000"
 
+# Accepted header spellings for each required column (same as the backend's COLUMN_MAPPING)
+COLUMN_VARIATIONS = {
+    'name': ['name', 'student_name', 'full_name'],
+    'email': ['email', 'email_id', 'email_address'],
+    'year_of_study': ['year_of_study', 'year', 'academic_year'],
+    'branch': ['branch', 'department', 'course']
+}
+# Flat lookup from every accepted spelling to its column
+COLUMN_ALIASES = {variation: col for col, variations in COLUMN_VARIATIONS.items() for variation in variations}
+
+# calamine (Rust) reads Excel files many times faster than openpyxl, when installed
+# alongside pandas 2.2 or newer (older pandas has no calamine engine)
+HAS_CALAMINE = (importlib.util.find_spec("python_calamine") is not None
+                and tuple(int(part) for part in pd.__version__.split(".")[:2]) >= (2, 2))
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """HTTP session shared by every rerun, so backend calls reuse kept-alive connections."""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=10))
+    return session
+
 def upload_files(excel_file, template_file=None):
     """Upload files to the backend."""
     try:
@@ -23,7 +49,7 @@ def upload_files(excel_file, template_file=None):
         if template_file:
             files["template_file"] = (template_file.name, template_file, "application/pdf")
         
-        response = requests.post(f"{API_BASE_URL}/upload-files", files=files)
+        response = get_session().post(f"{API_BASE_URL}/upload-files", files=files)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -43,7 +69,7 @@ def start_processing(task_id, email_config):
             "smtp_port": email_config["smtp_port"]
         }
         
-        response = requests.post(f"{API_BASE_URL}/process-certificates", data=data)
+        response = get_session().post(f"{API_BASE_URL}/process-certificates", data=data)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -53,17 +79,29 @@ def start_processing(task_id, email_config):
 def get_status(task_id):
     """Get processing status."""
     try:
-        response = requests.get(f"{API_BASE_URL}/status/{task_id}")
+        response = get_session().get(f"{API_BASE_URL}/status/{task_id}")
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
         st.error(f"Error getting status: {e}")
         return None
 
+def stream_status(task_id):
+    """Yield status updates pushed by the backend (Server-Sent Events) until the task finishes."""
+    try:
+        # The backend sends a keepalive comment every 15s, so a 60s read timeout only trips if it's gone
+        with get_session().get(f"{API_BASE_URL}/status/{task_id}/stream", stream=True, timeout=(5, 60)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data: "):
+                    yield json.loads(line[len("data: "):])
+    except requests.exceptions.RequestException as e:
+        st.warning(f"Live status updates interrupted: {e}")
+
 def cleanup_task(task_id):
     """Clean up task files."""
     try:
-        response = requests.delete(f"{API_BASE_URL}/cleanup/{task_id}")
+        response = get_session().delete(f"{API_BASE_URL}/cleanup/{task_id}")
         response.raise_for_status()
         return True
     except requests.exceptions.RequestException as e:
@@ -76,7 +114,7 @@ def main():
     
     # Check backend connection
     try:
-        response = requests.get(f"{API_BASE_URL}/health")
+        response = get_session().get(f"{API_BASE_URL}/health")
         if response.status_code != 200:
             st.error("⚠️ Backend server is not responding. Please ensure the FastAPI server is running on port 8000.")
             st.stop()
@@ -95,6 +133,21 @@ def main():
     else:
         help_page()
 
+@st.cache_data(max_entries=8, show_spinner=False)
+def parse_student_file(file_name: str, data: bytes) -> pd.DataFrame:
+    """Parse an uploaded roster for preview. Keyed on the file's bytes, so clicking Render
+    again (or re-uploading the same file) doesn't parse it again."""
+    buffer = io.BytesIO(data)
+    if file_name.lower().endswith('.csv'):
+        return pd.read_csv(buffer)
+    if HAS_CALAMINE:
+        try:
+            return pd.read_excel(buffer, engine="calamine")
+        except ValueError:
+            # calamine couldn't read it; let the default reader decide
+            buffer.seek(0)
+    return pd.read_excel(buffer)
+
 def upload_and_process_page():
     st.header("📤 Upload Files & Configure Email")
 
@@ -111,26 +164,16 @@ def upload_and_process_page():
         df = None
         if excel_file and render_btn:
             try:
-                if excel_file.name.lower().endswith('.csv'):
-                    df = pd.read_csv(excel_file)
-                else:
-                    df = pd.read_excel(excel_file)
+                df = parse_student_file(excel_file.name, excel_file.getvalue())
                 st.success(f"✅ File loaded: {len(df)} records found")
                 with st.expander("Preview Data"):
                     st.dataframe(df.head())
-                # Validate columns
-                expected_cols = ['name', 'email', 'year_of_study', 'branch']
-                df_cols_lower = [col.lower().strip() for col in df.columns]
-                missing_info = []
-                for col in expected_cols:
-                    variations = {
-                        'name': ['name', 'student_name', 'full_name'],
-                        'email': ['email', 'email_id', 'email_address'],
-                        'year_of_study': ['year_of_study', 'year', 'academic_year'],
-                        'branch': ['branch', 'department', 'course']
-                    }
-                    if not any(var in df_cols_lower for var in variations[col]):
-                        missing_info.append(f"No column found for '{col}'. Expected variations: {', '.join(variations[col])}")
+                # Validate columns, normalizing headers the way the backend does ("Year of Study" -> year_of_study)
+                found = {COLUMN_ALIASES.get(str(col).lower().replace(" ", "_").strip()) for col in df.columns}
+                missing_info = [
+                    f"No column found for '{col}'. Expected variations: {', '.join(variations)}"
+                    for col, variations in COLUMN_VARIATIONS.items() if col not in found
+                ]
                 if missing_info:
                     st.warning("⚠️ Column validation issues:")
                     for issue in missing_info:
@@ -244,30 +287,13 @@ def view_status_page():
                     if 'current_task_id' in st.session_state:
                         del st.session_state['current_task_id']
         
-        # Get and display status
+        # Get and display status; the placeholder is redrawn in place by live updates below
         status_data = get_status(task_id)
+        status_placeholder = st.empty()
         
         if status_data:
-            status = status_data['status']
-            message = status_data['message']
-            processed = status_data.get('processed_count', 0)
-            total = status_data.get('total_count', 0)
-            
-            # Status indicator
-            if status == "completed":
-                st.success(f"✅ {message}")
-            elif status == "error":
-                st.error(f"❌ {message}")
-            elif status == "processing":
-                st.info(f"⏳ {message}")
-            else:
-                st.info(f"📋 {message}")
-            
-            # Progress bar
-            if total > 0:
-                progress = processed / total
-                st.progress(progress)
-                st.write(f"Progress: {processed}/{total} ({progress:.1%})")
+            with status_placeholder.container():
+                show_status_summary(status_data)
             
             # Detailed results
             if 'results' in status_data and status_data['results']:
@@ -295,11 +321,40 @@ def view_status_page():
                         for student in results['failed']:
                             st.write(f"• {student['name']} - {student['email']}: {student.get('error', 'Unknown error')}")
         
-        # Auto-refresh
+        # Auto-refresh: follow the backend's status stream instead of re-polling the whole page
         if auto_refresh and status_data and status_data['status'] == 'processing':
-            time.sleep(3)
+            for status_data in stream_status(task_id):
+                with status_placeholder.container():
+                    show_status_summary(status_data)
+            if status_data['status'] == 'processing':
+                # Stream dropped mid-task: fall back to a slow poll
+                time.sleep(3)
+            # Rerun once more to show the final results
             st.rerun()
 
+def show_status_summary(status_data):
+    """Status message and progress bar for a task."""
+    status = status_data['status']
+    message = status_data['message']
+    processed = status_data.get('processed_count', 0)
+    total = status_data.get('total_count', 0)
+    
+    # Status indicator
+    if status == "completed":
+        st.success(f"✅ {message}")
+    elif status == "error":
+        st.error(f"❌ {message}")
+    elif status == "processing":
+        st.info(f"⏳ {message}")
+    else:
+        st.info(f"📋 {message}")
+    
+    # Progress bar
+    if total > 0:
+        progress = processed / total
+        st.progress(progress)
+        st.write(f"Progress: {processed}/{total} ({progress:.1%})")
+
 def help_page():
     st.header("📖 Help & Instructions")
     
@@ -0,0 +1,35 @@
+"""
+Export dslim/bert-base-NER to ONNX and quantize it to dynamic INT8.
+
+Run once at build time; a.py loads the result from NER_ONNX_DIR when present:
+
+    python quantize_ner.py [output_dir]
+"""
+import os
+import sys
+
+from optimum.onnxruntime import ORTModelForTokenClassification, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+from transformers import AutoTokenizer
+
+NER_MODEL_NAME = "dslim/bert-base-NER"
+NER_ONNX_DIR = os.getenv("NER_ONNX_DIR", "models/bert-base-NER-int8")
+
+
+def quantize_ner_model(save_dir: str = NER_ONNX_DIR) -> str:
+    """Export the NER model to ONNX, quantize it and save it with its tokenizer."""
+    export_dir = save_dir + "-fp32"
+    ort_model = ORTModelForTokenClassification.from_pretrained(NER_MODEL_NAME, export=True)
+    ort_model.save_pretrained(export_dir)
+
+    quantizer = ORTQuantizer.from_pretrained(export_dir)
+    qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=save_dir, quantization_config=qconfig)
+
+    AutoTokenizer.from_pretrained(NER_MODEL_NAME).save_pretrained(save_dir)
+    return save_dir
+
+
+if __name__ == "__main__":
+    out = quantize_ner_model(sys.argv[1] if len(sys.argv) > 1 else NER_ONNX_DIR)
+    print(f"Quantized NER model saved to {out}")
@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from backend import emailer
+from backend.emailer import EmailSender
+from backend.models import EmailConfig
+
+
+class _AcceptingSMTP:
+    """smtplib.SMTP stand-in that accepts every message."""
+    sent = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def send_message(self, msg):
+        self.sent.append(msg['To'])
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SendBulkEmailsTest(unittest.TestCase):
+    def setUp(self):
+        _AcceptingSMTP.sent = []
+        fd, self.certificate_path = tempfile.mkstemp(suffix=".pdf")
+        os.write(fd, b"%PDF-1.4\n")
+        os.close(fd)
+        self.addCleanup(os.remove, self.certificate_path)
+        self.sender = EmailSender(EmailConfig(sender_email="sender@example.com", sender_password="secret",
+                                              smtp_server="smtp.example.com", smtp_port=587))
+
+    def _student(self, name, email):
+        return {'name': name, 'email': email, 'branch': 'CSE', 'year_of_study': '3'}
+
+    def test_malformed_addresses_do_not_abort_valid_sends(self):
+        invalid = [self._student(f"Bad {i}", f"not-an-address-{i}") for i in range(10)]
+        valid = [self._student(f"Good {i}", f"good{i}@example.com") for i in range(10)]
+        students = invalid + valid
+        with mock.patch.object(emailer.smtplib, 'SMTP', _AcceptingSMTP):
+            results = self.sender.send_bulk_emails(students, [self.certificate_path] * len(students), max_workers=1)
+        self.assertEqual(results['success_count'], 10)
+        self.assertEqual(results['failure_count'], 10)
+        self.assertEqual(sorted(_AcceptingSMTP.sent), sorted(student['email'] for student in valid))
+        self.assertTrue(all('Invalid email address' in failed['error'] for failed in results['failed']))
+
+    def test_server_failures_abort_remaining_sends(self):
+        students = [self._student(f"Student {i}", f"student{i}@example.com") for i in range(20)]
+
+        class RejectingSMTP(_AcceptingSMTP):
+            def send_message(self, msg):
+                raise emailer.smtplib.SMTPRecipientsRefused({msg['To']: (550, b"rejected")})
+
+        with mock.patch.object(emailer.smtplib, 'SMTP', RejectingSMTP):
+            results = self.sender.send_bulk_emails(students, [self.certificate_path] * len(students), max_workers=1)
+        self.assertEqual(results['success_count'], 0)
+        aborted = [failed for failed in results['failed'] if 'aborted' in failed['error']]
+        self.assertEqual(len(aborted), len(students) - emailer.ABORT_MIN_ATTEMPTS)
+
+
+if __name__ == "__main__":
+    unittest.main()